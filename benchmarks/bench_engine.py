@@ -0,0 +1,315 @@
+"""
+Engine performance benchmarks.
+
+    python benchmarks/bench_engine.py --out bench.json
+    python benchmarks/bench_engine.py --sizes 100 1000 --baseline bench.json
+    python benchmarks/bench_engine.py --load new.json --baseline bench.json
+
+Runs Engine.step on pre-populated corridors of 100 to 20k agents, builds
+NavigationGrid at several dx and times the spawn and collision phases on
+their own. Results are written as JSON; with --baseline every result is
+compared to the stored run and the script exits with status 1 if any
+metric got worse by more than --tolerance.
+"""
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+import yaml
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from model.engine import Engine  # noqa: E402
+from model.navigation import NavigationGrid  # noqa: E402
+from model.neighbors import cell_list_pairs  # noqa: E402
+from model.update import resolve_collisions  # noqa: E402
+from model.walls import Wall  # noqa: E402
+from model.workspace import Workspace  # noqa: E402
+
+CONFIGS = ("corridor_empty", "corridor_bottleneck")
+SIZES = (100, 300, 1000, 3000, 10000, 20000)
+DX_VALUES = (0.2, 0.1, 0.05, 0.025)
+
+# Compared metric per benchmark and whether higher is better.
+METRICS = {
+    "step": ("agent_steps_per_s", True),
+    "nav_grid": ("build_s", False),
+    "spawn": ("seconds", False),
+    "collisions": ("solve_s", False),
+}
+
+
+def load_config(name):
+    path = name if os.path.exists(name) else os.path.join(
+        os.path.dirname(__file__), "..", "configs", name + ".yaml")
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def stretched_config(cfg, n, density, backend="numpy", precision="float32"):
+    """
+    Copy of a left/right corridor cfg lengthened so n agents fill it at
+    `density` agents per m^2, with spawning switched off.
+    """
+    cfg = copy.deepcopy(cfg)
+    dom = cfg["domain"]
+    height = dom["ymax"] - dom["ymin"]
+    xmax = dom["xmin"] + max(dom["xmax"] - dom["xmin"], n / (density * height))
+    dom["xmax"] = xmax
+    spawn = cfg["spawn"]
+    spawn["right"]["x"] = xmax - 0.5
+    spawn["left"]["target"] = [xmax - 0.5, spawn["left"]["target"][1]]
+    spawn["rate"] = 0.0
+    spawn["max_agents"] = n
+    cfg["simulation"].update(backend=backend, precision=precision, seed=0)
+    return cfg
+
+
+def populate(engine, n, seed=0):
+    """Fill engine with n agents on a jittered lattice, alternating destinations."""
+    rng = np.random.default_rng(seed)
+    dom = engine.cfg["domain"]
+    margin = engine.params.radius
+    x0, x1 = dom["xmin"] + 1.0, dom["xmax"] - 1.0
+    y0, y1 = dom["ymin"] + margin, dom["ymax"] - margin
+    cols = max(1, int(np.ceil(np.sqrt(n * (x1 - x0) / (y1 - y0)))))
+    rows = int(np.ceil(n / cols))
+    sx, sy = (x1 - x0) / cols, (y1 - y0) / rows
+    cell = np.arange(n)
+    pos = np.column_stack((x0 + (cell % cols + 0.5) * sx, y0 + (cell // cols + 0.5) * sy))
+    pos += rng.uniform(-0.25, 0.25, (n, 2)) * (sx, sy)
+
+    engine._reserve(n)
+    idx = np.arange(n)
+    group = (idx % engine.routes.n_groups).astype(np.int32)
+    engine.pos[idx] = pos
+    engine.vel[idx] = 0.0
+    engine.group[idx] = group
+    engine.target[idx] = engine.routes.dest_targets[group]
+    engine.origin[idx] = group
+    engine.spawn_time[idx] = 0.0
+    engine.ids[idx] = idx
+    sampled = engine.params.sample(n, rng)
+    for name in engine.AGENT_ATTRIBUTES:
+        getattr(engine, name)[idx] = sampled.get(name, getattr(engine.params, name))
+    engine.active[idx] = True
+    engine._next_id = engine.total_spawned = engine.total_arrivals = n
+    return engine
+
+
+def _max_rss():
+    try:
+        import resource
+    except ImportError:  # pragma: no cover
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def bench_step(name, cfg, n, steps, warmup, density, backend, precision):
+    engine = populate(Engine(stretched_config(cfg, n, density, backend, precision)), n)
+    for _ in range(warmup):
+        engine.step()
+
+    agent_steps = 0
+    t0 = time.perf_counter()
+    for _ in range(steps):
+        agent_steps += int(np.count_nonzero(engine.active))
+        engine.step()
+    elapsed = time.perf_counter() - t0
+
+    # Peak of memory allocated during a step, measured separately because
+    # tracemalloc slows the step down.
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for _ in range(3):
+        engine.step()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+
+    return {
+        "bench": "step", "config": name, "agents": n, "steps": steps, "seconds": elapsed,
+        "steps_per_s": steps / elapsed, "agent_steps_per_s": agent_steps / elapsed,
+        "peak_step_bytes": peak,
+        "state_bytes": sum(getattr(engine, field).nbytes for field in engine.AGENT_FIELDS),
+        "max_rss_bytes": _max_rss(),
+    }
+
+
+def bench_nav_grid(name, cfg, dx, repeats):
+    """Uncached NavigationGrid construction; the fastest of repeats builds (the first pays for imports)."""
+    walls = [Wall(w) for w in cfg.get("walls", [])]
+    target = cfg["spawn"]["left"]["target"]
+    grids = [NavigationGrid(cfg["domain"], walls, target, dx) for _ in range(max(1, repeats))]
+    grid = min(grids, key=lambda g: g.build_time)
+    return {"bench": "nav_grid", "config": name, "dx": dx, "cells": grid.rows * grid.cols,
+            "build_s": grid.build_time, "phases": grid.timings}
+
+
+def bench_spawn(name, cfg, n, density, repeats, backend, precision):
+    """One step's worth of n // 10 arrivals placed into an engine holding n agents."""
+    engine = populate(Engine(stretched_config(cfg, n, density, backend, precision)), n)
+    arrivals = max(1, n // 10)
+    rng = np.random.default_rng(1)
+    engine.spawn_backlog = rng.integers(0, len(engine.routes.source_weight), arrivals).astype(np.int16)
+    snap = engine.snapshot()
+
+    times = []
+    for _ in range(repeats):
+        engine.restore(snap)
+        t0 = time.perf_counter()
+        engine._spawn()
+        times.append(time.perf_counter() - t0)
+    placed = int(np.count_nonzero(engine.active)) - n
+    return {"bench": "spawn", "config": name, "agents": n, "arrivals": arrivals, "placed": placed,
+            "seconds": float(np.median(times))}
+
+
+def bench_collisions(name, cfg, n, density, repeats, precision):
+    """resolve_collisions on a populated state, with and without its own pair search."""
+    engine = populate(Engine(stretched_config(cfg, n, density, precision=precision)), n)
+    params = engine.params
+    pos = engine.pos[engine.active]
+    pairs = cell_list_pairs(pos, 2.25 * params.radius)
+    ws = Workspace(params.dtype)
+
+    solve, full = [], []
+    stats = {}
+    for _ in range(repeats):
+        p = pos.copy()
+        t0 = time.perf_counter()
+        resolve_collisions(p, params.radius, pairs=pairs, max_iter=params.collision_iterations,
+                           tol=params.collision_tolerance, stats=stats, ws=ws)
+        solve.append(time.perf_counter() - t0)
+
+        p = pos.copy()
+        t0 = time.perf_counter()
+        resolve_collisions(p, params.radius, max_iter=params.collision_iterations,
+                           tol=params.collision_tolerance, ws=ws)
+        full.append(time.perf_counter() - t0)
+    return {"bench": "collisions", "config": name, "agents": n, "pairs": len(pairs[0]),
+            "solve_s": float(np.median(solve)), "with_search_s": float(np.median(full)),
+            "residual_overlap": stats.get("residual_overlap")}
+
+
+def run(configs=CONFIGS, sizes=SIZES, dx_values=DX_VALUES, steps=50, warmup=5, density=1.5, repeats=5,
+        backend="numpy", precision="float32", only=None, log=print):
+    only = set(only or METRICS)
+    results = []
+
+    def record(row):
+        results.append(row)
+        log(_describe(row))
+
+    for name in configs:
+        cfg = load_config(name)
+        name = os.path.splitext(os.path.basename(name))[0]
+        if "nav_grid" in only:
+            for dx in dx_values:
+                record(bench_nav_grid(name, cfg, dx, min(repeats, 3)))
+        for n in sizes:
+            if "step" in only:
+                record(bench_step(name, cfg, n, steps, warmup, density, backend, precision))
+            if "spawn" in only:
+                record(bench_spawn(name, cfg, n, density, repeats, backend, precision))
+            if "collisions" in only:
+                record(bench_collisions(name, cfg, n, density, repeats, precision))
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "backend": backend, "precision": precision,
+            "steps": steps, "warmup": warmup, "density": density, "repeats": repeats,
+        },
+        "results": results,
+    }
+
+
+def result_key(row):
+    size = ("dx", row["dx"]) if "dx" in row else ("agents", row["agents"])
+    return (row["bench"], row["config"]) + size
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Rows (key, metric, baseline value, current value, relative change,
+    regression) for every result present in both runs. A regression is a
+    change for the worse larger than tolerance (0.1 = 10%).
+    """
+    base = {result_key(row): row for row in baseline["results"]}
+    rows = []
+    for row in current["results"]:
+        ref = base.get(result_key(row))
+        if ref is None:
+            continue
+        metric, higher_is_better = METRICS[row["bench"]]
+        old, new = ref[metric], row[metric]
+        change = new / old - 1.0 if old else 0.0
+        worse = -change if higher_is_better else change
+        rows.append((result_key(row), metric, old, new, change, worse > tolerance))
+    return rows
+
+
+def _describe(row):
+    label = f"{row['bench']:<10} {row['config']:<20}"
+    if row["bench"] == "step":
+        return (f"{label} n={row['agents']:<6} {row['steps_per_s']:9.1f} steps/s "
+                f"{row['agent_steps_per_s']:12.0f} agent-steps/s  peak {row['peak_step_bytes'] / 1e6:.1f} MB")
+    if row["bench"] == "nav_grid":
+        return f"{label} dx={row['dx']:<6} {row['build_s'] * 1e3:9.2f} ms  ({row['cells']} cells)"
+    if row["bench"] == "spawn":
+        return f"{label} n={row['agents']:<6} {row['seconds'] * 1e3:9.2f} ms  ({row['placed']}/{row['arrivals']} placed)"
+    return (f"{label} n={row['agents']:<6} {row['solve_s'] * 1e3:9.2f} ms solve, "
+            f"{row['with_search_s'] * 1e3:.2f} ms with search ({row['pairs']} pairs)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--configs", nargs="+", default=list(CONFIGS), help="config names or YAML paths")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--dx", nargs="+", type=float, default=list(DX_VALUES), dest="dx_values")
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--density", type=float, default=1.5, help="agents per m^2 of corridor")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--backend", default="numpy")
+    parser.add_argument("--precision", default="float32")
+    parser.add_argument("--only", nargs="+", choices=list(METRICS))
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--load", help="use results from this JSON file instead of running")
+    parser.add_argument("--baseline", help="JSON file of a previous run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.load:
+        with open(args.load, "r") as f:
+            current = json.load(f)
+    else:
+        current = run(args.configs, args.sizes, args.dx_values, args.steps, args.warmup, args.density,
+                      args.repeats, args.backend, args.precision, args.only)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(current, f, indent=1)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+    rows = compare(baseline, current, args.tolerance)
+    regressions = 0
+    for key, metric, old, new, change, regression in rows:
+        flag = "REGRESSION" if regression else ""
+        print(f"{' '.join(str(k) for k in key):<45} {metric:<18} {old:12.4g} -> {new:12.4g} {change:+7.1%} {flag}")
+        regressions += regression
+    print(f"{len(rows)} compared, {regressions} regressions (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,83 +1,7 @@
 #Work in Progress
-import sys
-import os
-# ERROR FIX: Ensure we can import from parent directory
-sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-
-import yaml
-import numpy as np
-import matplotlib.pyplot as plt
-from model.engine import Engine
-
-def run_experiment():
-    print("Running 'Faster is Slower' Experiment...")
-    config_path = os.path.join(os.path.dirname(__file__), '../configs/corridor_empty.yaml')
-    with open(config_path, 'r') as f:
-        base_cfg = yaml.safe_load(f)
-        
-    speeds = np.arange(0.5, 5.0, 0.5)
-    # Using the high rate from your updated config
-    injection_rate = base_cfg["spawn"]["rate"] 
-    
-    results = []
-    
-    for v in speeds:
-        cfg = base_cfg.copy()
-        cfg['agent']['desired_speed'] = float(v)
-        cfg['agent']['max_speed'] = float(v * 1.3)
-        cfg['spawn']['rate'] = injection_rate
-        # Ensure buffer is large enough
-        cfg['spawn']['max_agents'] = 2000 
-        
-        engine = Engine(cfg)
-        entry_times = {}
-        durations = []
-        target_exits = 200
-        
-        # Run loop
-        for step in range(20000):
-            t = engine.time
-            # Fast access to active IDs
-            active_ids = engine.ids[engine.active]
-            
-            # Track Entries
-            for aid in active_ids:
-                if aid not in entry_times:
-                    entry_times[aid] = t
-            
-            ids_pre = set(active_ids)
-            engine.step()
-            ids_post = set(engine.ids[engine.active])
-            
-            # Track Exits
-            exited = ids_pre - ids_post
-            for aid in exited:
-                if aid in entry_times:
-                    durations.append(t - entry_times[aid])
-            
-            if len(durations) >= target_exits:
-                break
-                
-        if len(durations) > 20:
-            avg = np.mean(durations[20:])
-            print(f"Speed {v:.1f} m/s: {avg:.3f}s")
-            results.append(avg)
-        else:
-            print(f"Speed {v:.1f} m/s: Jammed")
-            results.append(np.nan)
-            
-    plt.plot(speeds, results, 'o-', color='red', lw=2)
-    plt.title("Faster-is-Slower Effect")
-    plt.xlabel("Desired Speed (m/s)")
-    plt.ylabel("Avg Evacuation Time (s)")
-    plt.grid(True)
-    plt.savefig("faster_slower_result.png")
-    plt.show()
 import os
 import sys
-import yaml
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def _import_engine():
@@ -104,6 +28,13 @@ def _import_engine():
 
 Engine = _import_engine()
 
+try:
+    from experiments.sweep import load_config, run_sweep, write_table  # type: ignore
+    from experiments.steady_state import run_until_steady  # type: ignore
+except Exception:
+    from sweep import load_config, run_sweep, write_table  # type: ignore
+    from steady_state import run_until_steady  # type: ignore
+
 
 def _find_config_path():
     here = os.path.dirname(__file__)
@@ -123,63 +54,72 @@ def _find_config_path():
     )
 
 
-def run_experiment():
+def evacuation_task(cfg, target_exits=200, max_steps=20000):
+    """
+    Sweep task: mean travel time of exiting agents (first 20 discarded).
+
+    With cfg["steady_state"] set (run_until_steady options), the transient is
+    cut by MSER and the run stops once the travel-time CI is narrow enough or
+    the corridor jams; mean_travel_time is NaN for jammed runs.
+    """
+    engine = Engine(cfg)
+    if cfg.get("steady_state") is not None:
+        result = run_until_steady(engine, metric="travel_time", **cfg["steady_state"])
+        if result["jammed"]:
+            result["travel_time"] = np.nan
+        result["mean_travel_time"] = result.pop("travel_time")
+        result["mean_travel_time_ci"] = result.pop("travel_time_ci")
+        result["exits"] = engine.total_exits
+        return result
+
+    durations = []
+    n_exits = 0
+
+    for _ in range(max_steps):
+        events = engine.step()
+        if len(events):
+            durations.append(events.travel_time)
+            n_exits += len(events)
+        if n_exits >= target_exits:
+            break
+
+    durations = np.concatenate(durations) if durations else np.zeros(0)
+    if n_exits > 20:
+        return {"mean_travel_time": float(np.mean(durations[20:])), "exits": n_exits}
+    return {"mean_travel_time": np.nan, "exits": n_exits}
+
+
+def run_experiment(max_workers=None, root_seed=0, adaptive=False):
     print("Running 'Faster is Slower' Experiment...")
 
-    config_path = _find_config_path()
-    with open(config_path, "r") as f:
-        base_cfg = yaml.safe_load(f)
-
     speeds = np.arange(0.5, 5.0, 0.5)
-    injection_rate = float(base_cfg["spawn"]["rate"])
-
-    results = []
-
-    for v in speeds:
-        cfg = {
-            **base_cfg,
-            "agent": dict(base_cfg["agent"]),
-            "spawn": dict(base_cfg["spawn"]),
+    points = [
+        {
+            "agent.desired_speed": float(v),
+            "agent.max_speed": float(v * 1.3),
+            "spawn.max_agents": 2000,
         }
+        for v in speeds
+    ]
+    # Steady-state options go into the base config, not the swept points,
+    # so they do not show up as a column of the result table.
+    base_cfg = load_config(_find_config_path())
+    if adaptive:
+        base_cfg["steady_state"] = {}
+    rows = run_sweep(evacuation_task, base_cfg, points,
+                     root_seed=root_seed, max_workers=max_workers)
+    write_table(rows, "faster_slower.csv")
 
-        cfg["agent"]["desired_speed"] = float(v)
-        cfg["agent"]["max_speed"] = float(v * 1.3)
-        cfg["spawn"]["rate"] = injection_rate
-        cfg["spawn"]["max_agents"] = 2000
-
-        engine = Engine(cfg)
-
-        entry_times = {}
-        durations = []
-        target_exits = 200
-
-        for _ in range(20000):
-            t = engine.time
-
-            active_ids = engine.ids[engine.active]
-            for aid in active_ids:
-                if aid not in entry_times:
-                    entry_times[aid] = t
-
-            ids_pre = set(active_ids)
-            engine.step()
-            ids_post = set(engine.ids[engine.active])
-
-            exited = ids_pre - ids_post
-            for aid in exited:
-                if aid in entry_times:
-                    durations.append(t - entry_times[aid])
-
-            if len(durations) >= target_exits:
-                break
-
-        if len(durations) > 20:
-            avg = float(np.mean(durations[20:]))
-            print(f"Speed {v:.1f} m/s: {avg:.3f}s")
-            results.append(avg)
-        else:
+    results = []
+    for v, row in zip(speeds, rows):
+        avg = row["mean_travel_time"]
+        if np.isnan(avg):
             print(f"Speed {v:.1f} m/s: Jammed")
-            results.append(np.nan)
+        else:
+            print(f"Speed {v:.1f} m/s: {avg:.3f}s")
+        results.append(avg)
+
+    import matplotlib.pyplot as plt
 
     plt.plot(speeds, results, "o-", lw=2)
     plt.title("Faster-is-Slower Effect")
@@ -192,6 +132,3 @@ def run_experiment():
 
 if __name__ == "__main__":
     run_experiment()
-
-if __name__ == "__main__":
-    run_experiment()
\ No newline at end of file
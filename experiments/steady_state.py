@@ -0,0 +1,138 @@
+import numpy as np
+
+
+def mser_truncation(x, batch_size=5):
+    """
+    MSER-m truncation point of series x.
+
+    Returns the number of leading observations to discard, or None if the
+    MSER statistic is minimised in the second half of the series (the run
+    has not reached steady state yet).
+    """
+    n = len(x) // batch_size
+    if n < 4:
+        return None
+    b = np.asarray(x[:n * batch_size], dtype=float).reshape(n, batch_size).mean(axis=1)
+
+    # Sum and sum of squares of every tail b[d:], for all d at once.
+    s1 = np.cumsum(b[::-1])[::-1]
+    s2 = np.cumsum((b * b)[::-1])[::-1]
+    m = np.arange(n, 0, -1, dtype=float)
+    stat = (s2 - s1 * s1 / m) / (m * m)
+
+    d = int(np.argmin(stat[:n - 1]))
+    if d > n // 2:
+        return None
+    return d * batch_size
+
+
+def batch_means_ci(x, n_batches=10, confidence=0.95):
+    """Mean of x and the half-width of its batch-means confidence interval."""
+    from scipy.stats import t as student_t
+
+    x = np.asarray(x, dtype=float)
+    size = len(x) // n_batches
+    if size < 1:
+        return float(np.mean(x)) if len(x) else np.nan, np.inf
+    means = x[len(x) - size * n_batches:].reshape(n_batches, size).mean(axis=1)
+    half = student_t.ppf(0.5 + confidence / 2, n_batches - 1) * means.std(ddof=1) / np.sqrt(n_batches)
+    return float(means.mean()), float(half)
+
+
+def overdue_time(engine):
+    """
+    Largest delay of an active agent behind its free-walking arrival: age
+    minus the straight-line distance from its inlet to its destination at
+    its max_speed. -inf with nobody in the domain.
+    """
+    idx = np.flatnonzero(engine.active)
+    if len(idx) == 0:
+        return -np.inf
+    routes = engine.routes
+    src = engine.origin[idx]
+    inlet = 0.5 * (routes.source_p0[src] + routes.source_p1[src])
+    dist = np.linalg.norm(routes.dest_targets[engine.group[idx]] - inlet, axis=1)
+    age = engine.time - engine.spawn_time[idx]
+    return float(np.max(age - dist / engine.max_speed[idx]))
+
+
+def run_until_steady(engine, metric="flux", bin_width=1.0, rel_width=0.1, abs_width=0.0,
+                     confidence=0.95, n_batches=10, min_time=10.0, max_time=300.0,
+                     check_every=5.0, jam_time=20.0):
+    """
+    Step engine until `metric` ("flux" or "travel_time") is stationary and
+    its confidence interval is narrow enough.
+
+    Flux is observed as exits per bin_width seconds, travel time per exiting
+    agent. Every check_every seconds (after min_time) the initial transient
+    is cut with MSER-5 and a batch-means CI is computed on the rest; the run
+    stops once the half-width is at most max(abs_width, rel_width * |mean|).
+    It also stops, unconverged, at max_time or once the spawn budget
+    (spawn.max_agents) is used up, since the flow stops being stationary
+    there. A run is flagged as jammed and stopped early when no agent has
+    exited for jam_time seconds and some agent is more than jam_time behind
+    its free-walking arrival (see overdue_time), so slow walkers that cannot
+    have reached the exit yet do not count as a jam.
+
+    Returns a dict with the estimate (metric), its CI half-width
+    (metric + "_ci"), converged, jammed, steady_from (start of the kept
+    window, in simulated seconds) and sim_time.
+    """
+    if metric not in ("flux", "travel_time"):
+        raise ValueError(f"Unknown metric {metric!r}, expected 'flux' or 'travel_time'")
+
+    steps_per_bin = max(1, int(round(bin_width / engine.dt)))
+    bin_width = steps_per_bin * engine.dt
+    bins = []
+    bin_exits = 0
+    travel_times = []
+    exit_times = []
+
+    result = {metric: np.nan, metric + "_ci": np.inf, "converged": False, "jammed": False,
+              "steady_from": np.nan}
+    next_check = max(min_time, check_every)
+    last_exit = -np.inf
+    step = 0
+
+    while engine.time < max_time:
+        events = engine.step()
+        step += 1
+        if len(events):
+            bin_exits += len(events)
+            last_exit = engine.time
+            if metric == "travel_time":
+                travel_times.append(events.travel_time)
+                exit_times.append(events.exit_time)
+        if step % steps_per_bin == 0:
+            bins.append(bin_exits / bin_width)
+            bin_exits = 0
+
+        if engine.time - last_exit >= jam_time and overdue_time(engine) >= jam_time:
+            result["jammed"] = True
+            break
+        if engine.total_arrivals >= engine.max_agents:
+            break
+        if engine.time < next_check:
+            continue
+        next_check += check_every
+
+        if metric == "flux":
+            series = np.asarray(bins)
+        else:
+            series = np.concatenate(travel_times) if travel_times else np.zeros(0)
+        if len(series) < 2 * n_batches:
+            continue
+        d = mser_truncation(series)
+        if d is None or len(series) - d < n_batches:
+            continue
+
+        mean, half = batch_means_ci(series[d:], n_batches, confidence)
+        result[metric] = mean
+        result[metric + "_ci"] = half
+        result["steady_from"] = d * bin_width if metric == "flux" else float(np.concatenate(exit_times)[d])
+        if half <= max(abs_width, rel_width * abs(mean)):
+            result["converged"] = True
+            break
+
+    result["sim_time"] = engine.time
+    return result
@@ -2,7 +2,6 @@ import os
 import sys
 import yaml
 import numpy as np
-import matplotlib.pyplot as plt
 
 
 def _import_engine():
@@ -32,6 +31,22 @@ def _import_engine():
 
 Engine = _import_engine()
 
+try:
+    from experiments.sweep import run_sweep, write_table  # type: ignore
+    from experiments.steady_state import run_until_steady  # type: ignore
+except Exception:
+    from sweep import run_sweep, write_table  # type: ignore
+    from steady_state import run_until_steady  # type: ignore
+
+
+def _import_ensemble():
+    try:
+        from model.ensemble import EnsembleEngine  # type: ignore
+    except Exception:
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+        from model.ensemble import EnsembleEngine  # type: ignore
+    return EnsembleEngine
+
 
 def _find_config_path():
     here = os.path.dirname(__file__)
@@ -51,43 +66,117 @@ def _find_config_path():
     )
 
 
+def throughput_task(cfg):
+    """
+    Sweep task: exit flux between t = 20 s and t = 50 s for one config.
+
+    If cfg["warm_start"] names an Engine snapshot, the run continues from it
+    (reseeded with simulation.seed) instead of simulating the warm-up again.
+    If cfg["steady_state"] is set (a dict of run_until_steady options, may be
+    empty), the window is chosen adaptively instead and the row also carries
+    flux_ci, converged, jammed, steady_from and sim_time.
+    """
+    if cfg.get("warm_start"):
+        engine = Engine.from_snapshot(cfg, cfg["warm_start"], seed=cfg["simulation"].get("seed"))
+    else:
+        engine = Engine(cfg)
+
+    if cfg.get("steady_state") is not None:
+        return run_until_steady(engine, metric="flux", **cfg["steady_state"])
+
+    t_start, t_end = 20.0, 50.0
+    duration = t_end - t_start
+    exits = 0
+
+    while engine.time < t_end:
+        events = engine.step()
+        if engine.time >= t_start:
+            exits += len(events)
+
+    return {"flux": exits / duration}
+
+
 def measure_throughput(injection_rate):
     config_path = _find_config_path()
     with open(config_path, "r") as f:
         cfg = yaml.safe_load(f)
 
     cfg["spawn"]["rate"] = float(injection_rate)
+    return throughput_task(cfg)["flux"]
 
-    engine = Engine(cfg)
+
+def measure_throughput_forked(injection_rate, seeds):
+    """Mean flux over seeds, all forked from one shared 20 s warm-up."""
+    config_path = _find_config_path()
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+    cfg["spawn"]["rate"] = float(injection_rate)
+
+    warm = Engine(cfg)
+    while warm.time < 20.0:
+        warm.step()
+
+    fluxes = []
+    for seed in seeds:
+        engine = warm.fork(seed=seed)
+        exits = 0
+        while engine.time < 50.0:
+            exits += len(engine.step())
+        fluxes.append(exits / 30.0)
+    return float(np.mean(fluxes))
+
+
+def measure_throughput_ensemble(injection_rates, repeats=1):
+    """Mean exit flux per rate, all rates x repeats advanced as one ensemble."""
+    config_path = _find_config_path()
+    with open(config_path, "r") as f:
+        cfg = yaml.safe_load(f)
+
+    rates = np.repeat(np.asarray(injection_rates, dtype=float), repeats)
+    engine = _import_ensemble()(cfg, overrides=[{"spawn_rate": float(r)} for r in rates])
 
     t_start, t_end = 20.0, 50.0
     duration = t_end - t_start
-    exits = 0
+    exits = np.zeros(engine.K, dtype=np.int64)
 
     while engine.time < t_end:
-        n_before = len(engine.agents)
-        engine.step()
-        n_after = len(engine.agents)
-
+        step_exits = engine.step()
         if engine.time >= t_start:
-            diff = n_before - n_after
-            if diff > 0:
-                exits += diff
+            exits += step_exits
 
-    return exits / duration
+    return (exits / duration).reshape(-1, repeats).mean(axis=1)
 
 
-def find_critical_rate():
+def find_critical_rate(repeats=0, max_workers=None, root_seed=0, adaptive=False):
+    """
+    Saturation curve. By default every rate runs as its own task on a
+    process pool; repeats > 0 instead runs every rate that many times as one
+    ensemble. adaptive=True measures each rate until its flux is stationary
+    with a narrow CI (see steady_state.run_until_steady) instead of over the
+    fixed 20-50 s window.
+    """
     print("Running Throughput Saturation Analysis...")
-    print(f"{'Input Rate':<12} | {'Output Flux':<12} | {'Efficiency':<10}")
-    print("-" * 40)
 
     rates = np.arange(1.0, 16.0, 1.0)
-    fluxes = []
+    if repeats > 0:
+        fluxes = list(measure_throughput_ensemble(rates, repeats))
+    else:
+        with open(_find_config_path(), "r") as f:
+            base_cfg = yaml.safe_load(f)
+        if adaptive:
+            base_cfg["steady_state"] = {}
+        rows = run_sweep(
+            throughput_task, base_cfg, {"spawn.rate": [float(r) for r in rates]},
+            root_seed=root_seed, max_workers=max_workers,
+            on_result=lambda row: print(f"  done: rate {row['spawn.rate']:.1f} -> {row['flux']:.3f}"),
+        )
+        write_table(rows, "throughput_sweep.csv")
+        fluxes = [row["flux"] for row in rows]
 
-    for r in rates:
-        j = measure_throughput(r)
-        fluxes.append(j)
+    print(f"{'Input Rate':<12} | {'Output Flux':<12} | {'Efficiency':<10}")
+    print("-" * 40)
+
+    for r, j in zip(rates, fluxes):
         efficiency = j / r if r > 0 else 0.0
         print(f"{r:<12.1f} | {j:<12.3f} | {efficiency:.2f}")
 
@@ -107,6 +196,9 @@ def find_critical_rate():
     with open("critical_rate.txt", "w") as f:
         f.write(str(critical_rate))
 
+    # Imported here so sweep workers and headless runs skip matplotlib.
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(8, 6))
     plt.plot(rates, fluxes, "o-", linewidth=2, label="Measured Flux")
     plt.plot(rates, rates, "k--", alpha=0.3, label="Ideal (Free Flow)")
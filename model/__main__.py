@@ -0,0 +1,165 @@
+"""
+Headless runner: python -m model CONFIG [options]
+
+    python -m model configs/corridor_empty.yaml --duration 120 --interval 5
+    python -m model corridor_bottleneck --exits 200 --format csv -o run.csv
+    python -m model corridor_empty --set spawn.rate=8 --set simulation.backend=numba
+
+Runs the scenario until --duration simulated seconds or --exits exits
+(whichever comes first, and at the latest once the spawn budget is used
+up and the domain is empty). Every --interval seconds one row of metrics
+is streamed as JSON lines or CSV: time, steps, interval (its length in
+simulated seconds), active, spawned, exits (in the interval), total_exits,
+flux (exits per second), mean_speed, mean_density and mean_travel_time (of
+this interval's exits). The last row covers whatever is left of the run and
+may be shorter than --interval; check its interval before using its flux.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+
+import yaml
+import numpy as np
+
+from .engine import Engine
+
+COLUMNS = ("time", "steps", "interval", "active", "spawned", "exits", "total_exits", "flux",
+           "mean_speed", "mean_density", "mean_travel_time")
+
+
+def load_config(name):
+    """YAML scenario from a path, or configs/<name>.yaml next to the package."""
+    path = name
+    if not os.path.exists(path):
+        path = os.path.join(os.path.dirname(__file__), "..", "configs", name + ".yaml")
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No scenario {name!r} (tried {name} and {os.path.abspath(path)})")
+    with open(path, "r") as f:
+        return yaml.safe_load(f)
+
+
+def apply_override(cfg, assignment):
+    """Apply "a.b=value" to cfg; value is parsed as YAML (numbers, lists, true/false)."""
+    key, sep, value = assignment.partition("=")
+    if not sep:
+        raise ValueError(f"Expected key=value, got {assignment!r}")
+    *parents, leaf = key.split(".")
+    node = cfg
+    for part in parents:
+        node = node.setdefault(part, {})
+    node[leaf] = yaml.safe_load(value)
+
+
+def run(engine, duration=None, max_exits=None, interval=1.0, emit=None):
+    """
+    Step engine until duration (simulated seconds) or max_exits, calling
+    emit(row) with the metrics of every interval. Returns the last row.
+    """
+    steps_per_interval = max(1, int(round(interval / engine.dt)))
+    interval = steps_per_interval * engine.dt
+    end_time = np.inf if duration is None else duration
+    max_exits = np.inf if max_exits is None else max_exits
+
+    steps = 0
+    row = None
+    travel_times = []
+    exits = 0
+    while True:
+        events = engine.step()
+        steps += 1
+        if len(events):
+            exits += len(events)
+            travel_times.append(events.travel_time)
+
+        drained = engine.total_arrivals >= engine.max_agents and not engine.active.any() \
+            and len(engine.spawn_backlog) == 0
+        done = engine.time >= end_time - 1e-9 or engine.total_exits >= max_exits or drained
+        if steps % steps_per_interval and not done:
+            continue
+
+        active = engine.active
+        speed = np.linalg.norm(engine.vel[active], axis=1)
+        window = (steps - 1) % steps_per_interval + 1
+        tt = np.concatenate(travel_times) if travel_times else np.zeros(0)
+        row = {
+            "time": round(engine.time, 9),
+            "steps": steps,
+            "interval": round(window * engine.dt, 9),
+            "active": int(np.count_nonzero(active)),
+            "spawned": int(engine.total_spawned),
+            "exits": exits,
+            "total_exits": int(engine.total_exits),
+            "flux": exits / (window * engine.dt),
+            "mean_speed": float(speed.mean()) if len(speed) else None,
+            "mean_density": float(engine.density[active].mean()) if len(speed) else None,
+            "mean_travel_time": float(tt.mean()) if len(tt) else None,
+        }
+        if emit is not None:
+            emit(row)
+        exits = 0
+        travel_times = []
+        if done:
+            return row
+
+
+def _writer(stream, fmt):
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=COLUMNS)
+        writer.writeheader()
+
+        def emit(row):
+            writer.writerow({k: ("" if v is None else v) for k, v in row.items()})
+            stream.flush()
+    else:
+        def emit(row):
+            stream.write(json.dumps(row) + "\n")
+            stream.flush()
+    return emit
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m model", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("config", help="scenario YAML path or name under configs/")
+    parser.add_argument("--duration", type=float, help="simulated seconds to run")
+    parser.add_argument("--exits", type=int, help="stop after this many exits")
+    parser.add_argument("--interval", type=float, default=1.0, help="metrics interval in simulated seconds")
+    parser.add_argument("--format", choices=("jsonl", "csv"), help="default: csv for *.csv outputs, else jsonl")
+    parser.add_argument("-o", "--output", default="-", help="output file, - for stdout")
+    parser.add_argument("--seed", type=int, help="simulation.seed")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="config override, e.g. spawn.rate=8 (repeatable)")
+    parser.add_argument("--quiet", action="store_true", help="no summary on stderr")
+    args = parser.parse_args(argv)
+
+    if args.duration is None and args.exits is None:
+        args.duration = 60.0
+
+    cfg = load_config(args.config)
+    for assignment in args.set:
+        apply_override(cfg, assignment)
+    if args.seed is not None:
+        cfg["simulation"]["seed"] = args.seed
+
+    fmt = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        t0 = time.perf_counter()
+        engine = Engine(cfg)
+        engine.track_density = True
+        last = run(engine, args.duration, args.exits, args.interval, _writer(stream, fmt))
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+    if not args.quiet:
+        print(f"simulated {last['time']:.2f} s in {last['steps']} steps, {last['total_exits']} exits, "
+              f"{time.perf_counter() - t0:.2f} s wall", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+
+
+def default_cache_dir():
+    """MODEL_AB_CACHE_DIR if set, else ~/.cache/model-ab."""
+    env = os.environ.get("MODEL_AB_CACHE_DIR")
+    if env:
+        return env
+    return os.path.join(os.path.expanduser("~"), ".cache", "model-ab")
+
+
+class GeometryCache:
+    """
+    On-disk store for arrays derived from static geometry (navigation fields).
+
+    Each entry is a directory named by a content hash holding one .npy file
+    per array. Entries are loaded memory-mapped read-only, so processes that
+    use the same geometry share the page cache instead of private copies.
+    Eviction is least-recently-used by directory mtime, which is refreshed on
+    every load.
+    """
+    def __init__(self, cache_dir=None, max_bytes=None, max_entries=None):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+    @staticmethod
+    def key(kind, **parts):
+        """Stable hex digest of kind plus JSON-serializable parts."""
+        payload = json.dumps({"kind": kind, **parts}, sort_keys=True, default=_to_json)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """Return {name: read-only memmap} for key, or None on a miss."""
+        path = self._entry_dir(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            arrays = {
+                f[:-4]: np.load(os.path.join(path, f), mmap_mode="r")
+                for f in os.listdir(path) if f.endswith(".npy")
+            }
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return arrays
+
+    def store(self, key, arrays):
+        """Write arrays under key (atomically) and return the memory-mapped copies."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        final = self._entry_dir(key)
+        tmp = f"{final}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name, arr in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), np.ascontiguousarray(arr))
+        try:
+            os.rename(tmp, final)
+        except OSError:
+            # Another process stored the same entry first; keep theirs.
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict(keep=key)
+        return self.load(key)
+
+    def entries(self):
+        """List of (key, size in bytes, mtime) for complete entries."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        out = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if ".tmp-" in name or not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            out.append((name, size, os.path.getmtime(path)))
+        return out
+
+    def evict(self, max_bytes=None, max_entries=None, keep=None):
+        """Drop least-recently-used entries until both limits hold."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_entries = self.max_entries if max_entries is None else max_entries
+        if max_bytes is None and max_entries is None:
+            return
+
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(e[1] for e in entries)
+        count = len(entries)
+        for name, size, _ in entries:
+            over_bytes = max_bytes is not None and total > max_bytes
+            over_count = max_entries is not None and count > max_entries
+            if not (over_bytes or over_count):
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+            total -= size
+            count -= 1
+
+    def clear(self):
+        for name, _, _ in self.entries():
+            shutil.rmtree(self._entry_dir(name), ignore_errors=True)
+
+
+def _to_json(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Cannot hash object of type {type(obj).__name__}")
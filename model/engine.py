@@ -1,3 +1,5 @@
+import json
+import warnings
 import numpy as np
 
 # Import fallback for package/standalone usage.
@@ -7,72 +9,400 @@ except ImportError:  # pragma: no cover
     from update import update_physics, check_exits
 
 try:
-    from .walls import Wall
+    from .walls import Wall, WallSegments
+    from .params import SimParams
+    from .workspace import Workspace
 except ImportError:  # pragma: no cover
-    from walls import Wall
+    from walls import Wall, WallSegments
+    from params import SimParams
+    from workspace import Workspace
+
+try:
+    from .neighbors import VerletList, accept_spawns
+except ImportError:  # pragma: no cover
+    from neighbors import VerletList, accept_spawns
+
+try:
+    from .navigation import NavigationFieldSet, WallDistanceField
+    from .routes import Routes
+    from .kernels import resolve_backend
+except ImportError:  # pragma: no cover
+    from navigation import NavigationFieldSet, WallDistanceField
+    from routes import Routes
+    from kernels import resolve_backend
 
 
 class Engine:
+    # Per-agent buffers: name -> (trailing shape, dtype). Every entry is
+    # resized and permuted together by _resize() and compact(). float32
+    # entries follow simulation.precision.
+    AGENT_FIELDS = {
+        "active": ((), bool),
+        "pos": ((2,), np.float32),
+        "vel": ((2,), np.float32),
+        "target": ((2,), np.float32),
+        "group": ((), np.int32),
+        "ids": ((), np.int64),
+        "origin": ((), np.int16),
+        "spawn_time": ((), np.float64),
+        # Per-agent attributes (see SimParams.per_agent); scalar default when
+        # agent.distributions does not vary them.
+        "radius": ((), np.float32),
+        "desired_speed": ((), np.float32),
+        "max_speed": ((), np.float32),
+        "gradient_strength": ((), np.float32),
+        # Local density N_i / (pi R^2) from the last step (R = perception_radius).
+        "density": ((), np.float32),
+    }
+
+    # AGENT_FIELDS entries filled from SimParams at spawn.
+    AGENT_ATTRIBUTES = ("radius", "desired_speed", "max_speed", "gradient_strength")
+
+    # Non-buffer state captured by snapshot() besides the RNG.
+    SNAPSHOT_STATE = ("time", "total_spawned", "total_arrivals", "total_exits", "spawn_backlog", "_next_id",
+                      "spawn_epoch")
+
     def __init__(self, cfg, nav_field=None):
         self.cfg = cfg
-        self.dt = cfg["simulation"]["dt"]
+        self.params = params = SimParams(cfg)
+        self.dt = params.dt
         self.time = 0.0
+        self.backend = resolve_backend(cfg)
+        if params.per_agent and self.backend == "numba":
+            warnings.warn("agent.distributions needs per-agent parameters; using the numpy backend")
+            self.backend = "numpy"
 
-        # Fixed-capacity state buffers.
-        self.CAPACITY = 30
-        self.active = np.zeros(self.CAPACITY, dtype=bool)
-        self.pos = np.zeros((self.CAPACITY, 2), dtype=np.float32)
-        self.vel = np.zeros((self.CAPACITY, 2), dtype=np.float32)
-        self.target = np.zeros((self.CAPACITY, 2), dtype=np.float32)
-        self.ids = np.arange(self.CAPACITY, dtype=np.int32)
+        # Growable state buffers: capacity doubles on demand and, with
+        # simulation.shrink_storage, halves again after compaction.
+        self.AGENT_FIELDS = {name: (shape, params.dtype if dtype is np.float32 else dtype)
+                             for name, (shape, dtype) in type(self).AGENT_FIELDS.items()}
+        self.min_capacity = max(1, int(cfg["simulation"].get("initial_capacity", 64)))
+        self.shrink_storage = cfg["simulation"].get("shrink_storage", False)
+        self.capacity = 0
+        self._next_id = 0
+        for name, (shape, dtype) in self.AGENT_FIELDS.items():
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+        self._resize(self.min_capacity)
 
         self.walls = [Wall(w) for w in cfg.get("walls", [])]
+        # All walls as one segment array for the force and projection passes,
+        # or, with simulation.wall_field_dx, a cached distance field on a grid.
+        wall_cutoff = max(params.upper("radius"), params.wall_range)
+        self.wall_segments = WallSegments(self.walls, wall_cutoff)
+        self.wall_field = None
+        field_dx = cfg["simulation"].get("wall_field_dx")
+        if field_dx:
+            if self.backend == "numba":
+                warnings.warn("simulation.wall_field_dx is not used by the numba backend; using wall segments")
+            else:
+                self.wall_field = WallDistanceField.cached(cfg["domain"], self.walls, field_dx, wall_cutoff)
         self.spawn_rate = cfg["spawn"]["rate"]
+        # (time, total_arrivals, rate) since which arrivals follow spawn_rate;
+        # restarted when a snapshot is continued at another rate.
+        self.spawn_epoch = np.array([0.0, 0.0, self.spawn_rate])
 
         self.max_agents = cfg["spawn"].get("max_agents", 1000)
         self.total_spawned = 0
+        self.total_exits = 0
+        self.exit_events = ExitEvents.empty()
+
+        # Spawn sources and destination groups as arrays so a whole step's
+        # arrivals are drawn, and all exits tested, at once.
+        self.rng = np.random.default_rng(cfg["simulation"].get("seed"))
+        self.routes = Routes(cfg)
+        self.spawn_min_dist = cfg["spawn"].get("min_dist", 0.0)
+        self.exit_tolerance = params.target_tolerance
+
+        # Arrivals that could not be placed yet (source index per agent).
+        self.total_arrivals = 0
+        self.spawn_backlog = np.zeros(0, dtype=np.int16)
 
-        # Stored for optional external use.
+        # Optional NavigationGrid, list of grids (matched to destinations by
+        # target) or NavigationFieldSet that drives the gradient force instead
+        # of the straight-line direction.
+        if nav_field is not None and not isinstance(nav_field, NavigationFieldSet):
+            nav_field = NavigationFieldSet.for_destinations(nav_field, self.routes.dest_targets)
         self.nav_field = nav_field
 
+        # Optional Verlet pair list shared by the force and collision passes.
+        self.neighbor_list = None
+        if params.neighbor_search == "verlet":
+            # Cover the collision distance even after this step's move.
+            cutoff = max(params.perception_radius,
+                         2 * params.upper("radius") + 2 * params.upper("max_speed") * self.dt)
+            self.neighbor_list = VerletList(cutoff, params.verlet_skin)
+
+        # engine.density is only filled when something reads it: the density
+        # speed cap, simulation.track_density or a caller setting this flag.
+        self.track_density = params.density_speed_cap or bool(cfg["simulation"].get("track_density", False))
+
+        # Scratch buffers for update_physics, reused every step.
+        self.workspace = Workspace(params.dtype)
+
+        # Collision solver report for the last step (iterations, residual_overlap).
+        self.collision_stats = {"iterations": 0, "residual_overlap": 0.0, "contacts": 0}
+
+        # Optional TrajectoryRecorder, see attach_recorder().
+        self.recorder = None
+        # Optional StepProfiler, see attach_profiler().
+        self.profiler = None
+
+    def _resize(self, new_capacity):
+        """Reallocate every agent buffer to new_capacity, keeping slots [0, n)."""
+        keep = min(self.capacity, new_capacity)
+        for name, (shape, dtype) in self.AGENT_FIELDS.items():
+            buf = np.zeros((new_capacity,) + shape, dtype=dtype)
+            buf[:keep] = getattr(self, name)[:keep]
+            setattr(self, name, buf)
+        self.capacity = new_capacity
+
+    def _reserve(self, count):
+        """Make sure at least count free slots exist (amortized doubling)."""
+        free = self.capacity - int(np.count_nonzero(self.active))
+        if free >= count:
+            return
+        needed = self.capacity - free + count
+        new_capacity = max(self.capacity, self.min_capacity)
+        while new_capacity < needed:
+            new_capacity *= 2
+        self._resize(new_capacity)
+
+    def compact(self):
+        """Move active agents to the front of the buffers, preserving order."""
+        order = np.argsort(~self.active, kind="stable")
+        for name in self.AGENT_FIELDS:
+            buf = getattr(self, name)
+            buf[:] = buf[order]
+        if self.neighbor_list is not None:
+            self.neighbor_list.invalidate()
+
+    def _maybe_shrink(self):
+        n_active = int(np.count_nonzero(self.active))
+        if self.capacity <= self.min_capacity or n_active * 4 > self.capacity:
+            return
+        self.compact()
+        new_capacity = self.capacity
+        while new_capacity // 2 >= max(self.min_capacity, 2 * n_active):
+            new_capacity //= 2
+        self._resize(new_capacity)
+
+    def snapshot(self):
+        """Copy of the full simulation state (buffers, counters, backlog, RNG)."""
+        snap = {name: getattr(self, name).copy() for name in self.AGENT_FIELDS}
+        for name in self.SNAPSHOT_STATE:
+            value = getattr(self, name)
+            snap[name] = value.copy() if isinstance(value, np.ndarray) else value
+        snap["rng_state"] = json.dumps(self.rng.bit_generator.state)
+        return snap
+
+    def restore(self, snap):
+        """Load a snapshot() (or load_snapshot()) into this engine."""
+        self.capacity = len(snap["active"])
+        for name, (_, dtype) in self.AGENT_FIELDS.items():
+            if name in snap:
+                setattr(self, name, np.array(snap[name], dtype=dtype))
+            else:
+                # Snapshot from before per-agent attributes: use the scalars.
+                default = getattr(self.params, name) if name in self.AGENT_ATTRIBUTES else 0
+                setattr(self, name, np.full(self.capacity, default, dtype=dtype))
+        self.time = float(snap["time"])
+        self.total_spawned = int(snap["total_spawned"])
+        self.total_arrivals = int(snap["total_arrivals"])
+        self.total_exits = int(snap["total_exits"])
+        self._next_id = int(snap["_next_id"])
+        self.spawn_backlog = np.array(snap["spawn_backlog"], dtype=np.int16)
+        if "spawn_epoch" in snap:
+            self.spawn_epoch = np.array(snap["spawn_epoch"], dtype=float)
+        else:
+            # Snapshot from before spawn epochs: arrivals counted from t = 0 at
+            # whatever rate reproduces them.
+            self.spawn_epoch = np.array([0.0, 0.0, self.spawn_rate])
+            if int(self.spawn_rate * self.time) != self.total_arrivals:
+                self.spawn_epoch[2] = np.nan
+        if self.spawn_epoch[2] != self.spawn_rate:
+            # Continued at another spawn.rate: the new rate applies from now on.
+            self.spawn_epoch = np.array([self.time, self.total_arrivals, self.spawn_rate])
+        self.rng.bit_generator.state = json.loads(str(snap["rng_state"]))
+        if self.neighbor_list is not None:
+            self.neighbor_list.invalidate()
+
+    def save_snapshot(self, path):
+        np.savez_compressed(path, **self.snapshot())
+
+    @staticmethod
+    def load_snapshot(path):
+        with np.load(path, allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    @classmethod
+    def from_snapshot(cls, cfg, snap, nav_field=None, seed=None):
+        """
+        New engine for cfg continuing from snap (a dict or an .npz path).
+
+        seed reseeds the RNG; otherwise the snapshot's stream is resumed and
+        the run matches an uninterrupted one.
+        """
+        if isinstance(snap, str):
+            snap = cls.load_snapshot(snap)
+        engine = cls(cfg, nav_field=nav_field)
+        engine.restore(snap)
+        if seed is not None:
+            engine.rng = np.random.default_rng(seed)
+        return engine
+
+    def fork(self, seed=None, cfg=None):
+        """
+        Independent continuation of the current state, optionally reseeded
+        or with different parameters (cfg, e.g. another spawn.rate).
+        """
+        return type(self).from_snapshot(cfg if cfg is not None else self.cfg, self.snapshot(),
+                                        nav_field=self.nav_field, seed=seed)
+
+    def attach_recorder(self, recorder):
+        """Record frames into recorder (e.g. a TrajectoryRecorder) after every step; None detaches."""
+        self.recorder = recorder
+        return recorder
+
+    def attach_profiler(self, profiler):
+        """Time the phases of every step into profiler (e.g. a StepProfiler); None detaches."""
+        self.profiler = profiler
+        return profiler
+
     @property
     def agents(self):
         """Compatibility view for visualization utilities."""
+        prof = self.profiler
+        if prof is not None:
+            t0 = prof.clock()
         active_indices = np.where(self.active)[0]
-        return [AgentView(i, self) for i in active_indices]
+        views = [AgentView(i, self) for i in active_indices]
+        if prof is not None:
+            prof.lap("agents", t0)
+            prof.count("agent_views", len(views))
+        return views
 
     def step(self):
+        """Advance one time step and return this step's ExitEvents."""
+        prof = self.profiler
+        if prof is not None:
+            t0 = prof.begin_step(self)
+            spawned = self.total_spawned
         self._spawn()
+        if prof is not None:
+            t0 = prof.lap("spawn", t0)
+            prof.count("spawns", self.total_spawned - spawned)
+        self.exit_events = ExitEvents.empty()
         if np.any(self.active):
-            update_physics(self.pos, self.vel, self.target, self.active, self.walls, self.cfg, self.dt)
-            exited = check_exits(self.pos, self.target, self.active)
+            walls = self.wall_field if self.wall_field is not None else self.wall_segments
+            agent_params = {name: getattr(self, name) for name in self.params.per_agent}
+            update_physics(self.pos, self.vel, self.target, self.active, walls, self.params, self.dt,
+                           neighbors=self.neighbor_list, nav_field=self.nav_field, group=self.group,
+                           backend=self.backend, rng=self.rng, collision_stats=self.collision_stats,
+                           agent_params=agent_params, ws=self.workspace,
+                           density=self.density if self.track_density else None,
+                           profiler=prof)
+            if prof is not None:
+                t0 = prof.clock()
+            routes = self.routes
+            exited = check_exits(self.pos, self.group, self.active, routes.dest_targets,
+                                 routes.dest_normals, self.exit_tolerance, ws=self.workspace)
             if len(exited) > 0:
+                self.exit_events = ExitEvents(
+                    self.ids[exited], self.origin[exited], self.group[exited],
+                    self.spawn_time[exited], np.full(len(exited), self.time + self.dt),
+                )
+                self.total_exits += len(exited)
                 self.active[exited] = False
+                if self.shrink_storage:
+                    self._maybe_shrink()
+            if prof is not None:
+                t0 = prof.lap("exits", t0)
+                prof.count("exits", len(exited))
         self.time += self.dt
+        if self.recorder is not None:
+            self.recorder.on_step(self)
+            if prof is not None:
+                prof.lap("recorder", t0)
+        if prof is not None:
+            prof.end_step()
+        return self.exit_events
 
     def _spawn(self):
-        if self.total_spawned >= self.max_agents:
+        if self.total_arrivals < self.max_agents:
+            t0, arrivals0, _ = self.spawn_epoch
+            expected = min(int(arrivals0) + int(self.spawn_rate * (self.time - t0)), self.max_agents)
+            arrivals = expected - self.total_arrivals
+            if arrivals > 0:
+                routes = self.routes
+                sources = self.rng.choice(len(routes.source_weight), arrivals, p=routes.source_weight)
+                self.spawn_backlog = np.concatenate((self.spawn_backlog, sources.astype(np.int16)))
+                self.total_arrivals = expected
+
+        if len(self.spawn_backlog) == 0:
             return
 
-        expected = int(self.spawn_rate * self.time)
-        to_spawn = expected - self.total_spawned
-        if to_spawn <= 0:
+        src = self.spawn_backlog
+        p0 = self.routes.source_p0[src]
+        u = self.rng.random(len(src))[:, None]
+        cand = p0 + u * (self.routes.source_p1[src] - p0)
+
+        accepted = accept_spawns(self.pos, self.active, cand, src, self.spawn_min_dist)
+        count = int(np.count_nonzero(accepted))
+        self.spawn_backlog = src[~accepted]
+        if count == 0:
             return
 
-        free_slots = np.where(~self.active)[0]
-        count = min(to_spawn, len(free_slots))
-        indices = free_slots[:count]
+        self._reserve(count)
+        indices = np.where(~self.active)[0][:count]
+        src = src[accepted]
 
-        for idx in indices:
-            side = "left" if np.random.rand() < 0.5 else "right"
-            scfg = self.cfg["spawn"][side]
-            y_range = scfg["y_range"]
+        self.pos[indices] = cand[accepted]
+        self.vel[indices] = 0.0
+        self.density[indices] = 0.0
+        group = self.routes.source_group[src]
+        self.group[indices] = group
+        self.target[indices] = self.routes.dest_targets[group]
+        self.origin[indices] = src
+        self.spawn_time[indices] = self.time
+        sampled = self.params.sample(count, self.rng)
+        for name in self.AGENT_ATTRIBUTES:
+            getattr(self, name)[indices] = sampled.get(name, getattr(self.params, name))
+        self.ids[indices] = np.arange(self._next_id, self._next_id + count)
+        self._next_id += count
+        self.active[indices] = True
+        self.total_spawned += count
+
+        if self.neighbor_list is not None:
+            self.neighbor_list.invalidate()
+
+
+class ExitEvents:
+    """
+    Agents that exited during one step, as parallel arrays.
+
+    ids are the globally unique agent ids, origin the spawn source index and
+    group the destination group; times are in simulation seconds.
+    """
+    __slots__ = ("ids", "origin", "group", "spawn_time", "exit_time")
+
+    def __init__(self, ids, origin, group, spawn_time, exit_time):
+        self.ids = ids
+        self.origin = origin
+        self.group = group
+        self.spawn_time = spawn_time
+        self.exit_time = exit_time
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int32),
+                   np.zeros(0), np.zeros(0))
+
+    @property
+    def travel_time(self):
+        return self.exit_time - self.spawn_time
 
-            self.pos[idx] = [scfg["x"], np.random.uniform(y_range[0], y_range[1])]
-            self.vel[idx] = [0.0, 0.0]
-            self.target[idx] = scfg["target"]
-            self.active[idx] = True
-            self.total_spawned += 1
+    def __len__(self):
+        return len(self.ids)
 
 
 class AgentView:
@@ -94,7 +424,7 @@ class AgentView:
 
     @property
     def radius(self):
-        return self.engine.cfg["agent"]["radius"]
+        return float(self.engine.radius[self.idx])
 
     @property
     def target_pos(self):
@@ -102,4 +432,4 @@ class AgentView:
 
     @property
     def max_speed(self):
-        return self.engine.cfg["agent"]["max_speed"]
+        return float(self.engine.max_speed[self.idx])
@@ -0,0 +1,203 @@
+import numpy as np
+
+# Import compatibility (package vs standalone)
+try:
+    from .forces import calculate_forces
+    from .params import SimParams
+    from .update import clamp_speed, density_speed_cap, project_walls, resolve_collisions, check_exits
+    from .neighbors import accept_spawns, cell_list_pairs
+    from .navigation import NavigationFieldSet
+    from .routes import Routes
+    from .walls import Wall, WallSegments
+except ImportError:  # pragma: no cover
+    from forces import calculate_forces
+    from params import SimParams
+    from update import clamp_speed, density_speed_cap, project_walls, resolve_collisions, check_exits
+    from neighbors import accept_spawns, cell_list_pairs
+    from navigation import NavigationFieldSet
+    from routes import Routes
+    from walls import Wall, WallSegments
+
+
+class EnsembleEngine:
+    """
+    K independent replicas of one scenario advanced by a single batched step.
+
+    State lives in (K, capacity, ...) buffers. Every phase (spawn, forces,
+    integration, walls, collisions, exits) runs once over the active agents of
+    all replicas; the neighbour search is labelled by replica so agents never
+    interact across replicas. Geometry and force gains are shared; per-replica
+    values can be given for REPLICA_PARAMS via overrides, e.g.
+    EnsembleEngine(cfg, overrides=[{"spawn_rate": r} for r in rates]).
+    """
+    REPLICA_PARAMS = ("spawn_rate", "max_speed")
+
+    # float32 entries follow simulation.precision, as in Engine.
+    AGENT_FIELDS = {
+        "active": ((), bool),
+        "pos": ((2,), np.float32),
+        "vel": ((2,), np.float32),
+        "target": ((2,), np.float32),
+        "group": ((), np.int32),
+    }
+
+    def __init__(self, cfg, replicas=None, overrides=None, nav_field=None):
+        if overrides is None:
+            overrides = [{} for _ in range(replicas or 1)]
+        for o in overrides:
+            unknown = set(o) - set(self.REPLICA_PARAMS)
+            if unknown:
+                raise ValueError(f"Unknown per-replica parameters: {sorted(unknown)}")
+
+        self.cfg = cfg
+        self.params = params = SimParams(cfg)
+        if params.per_agent:
+            raise ValueError("EnsembleEngine does not support agent.distributions; use Engine")
+        self.K = len(overrides)
+        self.dt = params.dt
+        self.time = 0.0
+
+        defaults = {
+            "spawn_rate": cfg["spawn"]["rate"],
+            "max_speed": params.max_speed,
+        }
+        for name in self.REPLICA_PARAMS:
+            setattr(self, name, np.array([o.get(name, defaults[name]) for o in overrides], dtype=float))
+
+        self.walls = [Wall(w) for w in cfg.get("walls", [])]
+        self.wall_segments = WallSegments(self.walls, max(params.radius, params.wall_range))
+        self.routes = Routes(cfg)
+        self.rng = np.random.default_rng(cfg["simulation"].get("seed"))
+        self.max_agents = cfg["spawn"].get("max_agents", 1000)
+        self.spawn_min_dist = cfg["spawn"].get("min_dist", 0.0)
+        self.exit_tolerance = params.target_tolerance
+
+        if nav_field is not None and not isinstance(nav_field, NavigationFieldSet):
+            nav_field = NavigationFieldSet.for_destinations(nav_field, self.routes.dest_targets)
+        self.nav_field = nav_field
+
+        self.total_arrivals = np.zeros(self.K, dtype=np.int64)
+        self.total_spawned = np.zeros(self.K, dtype=np.int64)
+        self.total_exits = np.zeros(self.K, dtype=np.int64)
+        self.step_exits = np.zeros(self.K, dtype=np.int64)
+        self.collision_stats = {"iterations": 0, "residual_overlap": 0.0, "contacts": 0}
+        # Queued arrivals as parallel (replica, source) arrays.
+        self.backlog_replica = np.zeros(0, dtype=np.int32)
+        self.backlog_source = np.zeros(0, dtype=np.int16)
+
+        self.AGENT_FIELDS = {name: (shape, params.dtype if dtype is np.float32 else dtype)
+                             for name, (shape, dtype) in type(self).AGENT_FIELDS.items()}
+        self.capacity = 0
+        for name, (shape, dtype) in self.AGENT_FIELDS.items():
+            setattr(self, name, np.zeros((self.K, 0) + shape, dtype=dtype))
+        self._resize(max(1, int(cfg["simulation"].get("initial_capacity", 64))))
+
+    def _resize(self, new_capacity):
+        keep = min(self.capacity, new_capacity)
+        for name, (shape, dtype) in self.AGENT_FIELDS.items():
+            buf = np.zeros((self.K, new_capacity) + shape, dtype=dtype)
+            buf[:, :keep] = getattr(self, name)[:, :keep]
+            setattr(self, name, buf)
+        self.capacity = new_capacity
+
+    def active_counts(self):
+        return np.count_nonzero(self.active, axis=1)
+
+    def step(self):
+        self._spawn()
+        self.step_exits[:] = 0
+
+        rep, slot = np.nonzero(self.active)
+        if len(rep) > 0:
+            self._update(rep, slot)
+        self.time += self.dt
+        return self.step_exits
+
+    def _update(self, rep, slot):
+        params = self.params
+        dt = self.dt
+
+        p = self.pos[rep, slot]
+        v = self.vel[rep, slot]
+        t = self.target[rep, slot]
+        g = self.group[rep, slot]
+
+        # One labelled search covers forces and this step's collisions.
+        cutoff = max(params.perception_radius, 2 * params.radius + 2 * self.max_speed.max() * dt)
+        pairs = cell_list_pairs(p, cutoff, labels=rep)
+
+        density = np.empty(len(p), dtype=p.dtype) if params.density_speed_cap else None
+        forces = calculate_forces(p, v, t, self.wall_segments, params, pairs=pairs, nav_field=self.nav_field,
+                                  group=g, rng=self.rng, density=density)
+        v += forces * dt
+        max_speed = self.max_speed[rep]
+        if density is not None:
+            max_speed = density_speed_cap(density, max_speed, params.speed_A)
+        clamp_speed(v, max_speed)
+        p += v * dt
+
+        project_walls(p, v, self.wall_segments, params.radius)
+        p = resolve_collisions(p, params.radius, pairs=pairs, max_iter=params.collision_iterations,
+                               tol=params.collision_tolerance, stats=self.collision_stats,
+                               walls=self.wall_segments, vel=v)
+
+        self.pos[rep, slot] = p
+        self.vel[rep, slot] = v
+
+        routes = self.routes
+        done = check_exits(p, g, np.ones(len(p), dtype=bool), routes.dest_targets,
+                           routes.dest_normals, self.exit_tolerance)
+        if len(done) > 0:
+            self.active[rep[done], slot[done]] = False
+            self.step_exits += np.bincount(rep[done], minlength=self.K)
+            self.total_exits += self.step_exits
+
+    def _spawn(self):
+        expected = np.minimum((self.spawn_rate * self.time).astype(np.int64), self.max_agents)
+        arrivals = np.maximum(expected - self.total_arrivals, 0)
+        n_new = int(arrivals.sum())
+        if n_new > 0:
+            routes = self.routes
+            new_rep = np.repeat(np.arange(self.K, dtype=np.int32), arrivals)
+            new_src = self.rng.choice(len(routes.source_weight), n_new, p=routes.source_weight)
+            self.backlog_replica = np.concatenate((self.backlog_replica, new_rep))
+            self.backlog_source = np.concatenate((self.backlog_source, new_src.astype(np.int16)))
+            self.total_arrivals += arrivals
+
+        if len(self.backlog_replica) == 0:
+            return
+
+        rep, src = self.backlog_replica, self.backlog_source
+        p0 = self.routes.source_p0[src]
+        u = self.rng.random(len(src))[:, None]
+        cand = p0 + u * (self.routes.source_p1[src] - p0)
+
+        accepted = accept_spawns(self.pos, self.active, cand, src, self.spawn_min_dist, labels=rep)
+        self.backlog_replica = rep[~accepted]
+        self.backlog_source = src[~accepted]
+        if not np.any(accepted):
+            return
+        rep, src, cand = rep[accepted], src[accepted], cand[accepted]
+
+        per_rep = np.bincount(rep, minlength=self.K)
+        needed = int((self.active_counts() + per_rep).max())
+        if needed > self.capacity:
+            new_capacity = max(self.capacity, 1)
+            while new_capacity < needed:
+                new_capacity *= 2
+            self._resize(new_capacity)
+
+        # k-th accepted agent of a replica takes that replica's k-th free slot.
+        order = np.argsort(rep, kind="stable")
+        rep, src, cand = rep[order], src[order], cand[order]
+        rank = np.arange(len(rep)) - np.repeat(np.cumsum(per_rep) - per_rep, per_rep)
+        free_first = np.argsort(self.active, axis=1, kind="stable")
+        slot = free_first[rep, rank]
+
+        group = self.routes.source_group[src]
+        self.pos[rep, slot] = cand
+        self.vel[rep, slot] = 0.0
+        self.group[rep, slot] = group
+        self.target[rep, slot] = self.routes.dest_targets[group]
+        self.active[rep, slot] = True
+        self.total_spawned += per_rep
@@ -1,50 +1,165 @@
 import numpy as np
 
-def calculate_forces(pos, vel, target, walls, cfg):
-    """Return per-agent force vectors (same shape as pos)."""
+# Import compatibility (package vs standalone)
+try:
+    from .neighbors import cell_list_pairs, dense_pairs
+    from .params import as_params
+    from .walls import as_segments
+    from .workspace import Workspace, scatter_add
+except ImportError:  # pragma: no cover
+    from neighbors import cell_list_pairs, dense_pairs
+    from params import as_params
+    from walls import as_segments
+    from workspace import Workspace, scatter_add
+
+
+def gradient_directions(pos, target, nav_field=None, group=None, out=None, ws=None):
+    """Unit direction of the gradient force for each agent (written to out if given)."""
+    ws = ws if ws is not None else Workspace(pos.dtype)
     n = len(pos)
-    if n == 0: return np.zeros((0, 2))
-    
-    forces = np.zeros((n, 2), dtype=np.float32)
-    
-    p_grad = cfg["forces"]["gradient"]["strength"]
-    p_rep = cfg["forces"]["repulsive"]["strength"]
-    p_decay = cfg["forces"]["repulsive"]["decay"]
-    p_gamma = cfg["forces"]["resistance"]["gamma"]
-    p_rand = cfg["forces"]["random"]["probability"]
-    s_rand = cfg["forces"]["random"]["strength"]
-    
-    diff = target - pos
-    dists = np.linalg.norm(diff, axis=1)
-    
-    mask_move = dists > 1e-6
-    dirs = np.zeros_like(diff)
-    dirs[mask_move] = diff[mask_move] / dists[mask_move, None]
-    
-    forces += dirs * p_grad
-    
-    r_vec = pos[:, None, :] - pos[None, :, :]
-    d2 = np.sum(r_vec**2, axis=2)
-    np.fill_diagonal(d2, np.inf)
-    
-    perception_sq = cfg["agent"]["perception_radius"] ** 2
-    mask_interact = d2 < perception_sq
-    
-    if np.any(mask_interact):
-        coeffs = p_rep * np.exp(-p_decay * d2) * 2.0
-        coeffs[~mask_interact] = 0.0
-        
-        f_rep = np.sum(r_vec * coeffs[:, :, None], axis=1)
-        forces += f_rep
-        
-        f_res = -f_rep * np.exp(-p_gamma)
-        forces += f_res
+    dirs = np.subtract(target, pos, out=out if out is not None else np.empty_like(pos))
+    dists = np.einsum("ij,ij->i", dirs, dirs, out=ws.get("grad_dist", n, dirs.dtype))
+    np.sqrt(dists, out=dists)
+
+    mask_move = np.greater(dists, 1e-6, out=ws.get("grad_mask", n, bool))
+    np.divide(dirs, dists[:, None], out=dirs, where=mask_move[:, None])
+    np.multiply(dirs, mask_move[:, None], out=dirs)
+
+    if nav_field is not None:
+        if group is None:
+            nav_dirs = nav_field.get_gradients(pos)
+        else:
+            nav_dirs = nav_field.get_gradients(pos, group)
+        has_nav = np.any(nav_dirs != 0.0, axis=1)
+        np.copyto(dirs, nav_dirs, where=has_nav[:, None], casting="same_kind")
+    return dirs
+
 
-    if p_rand > 0.0 and s_rand != 0.0:
+def random_forces(n, params, rng=None, ws=None):
+    """
+    Return (mask, vectors) of this step's random kicks, or None if disabled.
+
+    params: SimParams (a cfg dict is compiled on the fly).
+    rng: numpy Generator to draw from; the global np.random state if omitted.
+    ws: optional Workspace for the per-agent draws.
+    """
+    params = as_params(params)
+    p_rand = params.random_probability
+    s_rand = params.random_strength
+    if not (p_rand > 0.0 and s_rand != 0.0):
+        return None
+    if rng is None:
         rand_mask = np.random.rand(n) < p_rand
-        if np.any(rand_mask):
-            theta = np.random.uniform(0.0, 2.0 * np.pi, size=rand_mask.sum())
-            rand_vec = np.column_stack((np.cos(theta), np.sin(theta))) * s_rand
-            forces[rand_mask] += rand_vec
+    elif ws is None:
+        rand_mask = rng.random(n) < p_rand
+    else:
+        u = rng.random(out=ws.get("rand_u", n, np.float64))
+        rand_mask = np.less(u, p_rand, out=ws.get("rand_mask", n, bool))
+    if not np.any(rand_mask):
+        return None
+    uniform = np.random.uniform if rng is None else rng.uniform
+    theta = uniform(0.0, 2.0 * np.pi, size=rand_mask.sum())
+    return rand_mask, np.column_stack((np.cos(theta), np.sin(theta))) * s_rand
+
+
+def wall_forces(pos, walls, params, radius=None, out=None):
+    """
+    Exponential wall repulsion strength * exp(-decay * (d - radius)) along the
+    wall normal, summed over every segment within params.wall_range, or None
+    when forces.wall.strength is 0 (the default) or there are no walls.
+    radius: optional per-agent radii (default params.radius).
+    out: optional (n, 2) array the forces are added to (and returned).
+    """
+    params = as_params(params)
+    if params.wall_strength == 0.0 or walls is None or len(walls) == 0:
+        return None
+
+    segments = as_segments(walls, params.wall_range)
+    agent, _, dist, normal = segments.query(pos, params.wall_range)
+    contact = params.radius if radius is None else radius[agent]
+    mag = params.wall_strength * np.exp(-params.wall_decay * (dist - contact))
+    f = normal * mag[:, None]
+    if out is None:
+        out = np.zeros((len(pos), 2), dtype=pos.dtype)
+    return scatter_add(out, agent, f.astype(out.dtype, copy=False))
+
+
+def calculate_forces(pos, vel, target, walls, params, pairs=None, nav_field=None, group=None, rng=None,
+                     agent_params=None, out=None, ws=None, density=None, stats=None):
+    """
+    Return per-agent force vectors (same shape and dtype as pos).
+
+    Args:
+        params: SimParams (a cfg dict is compiled on the fly).
+        walls: WallSegments (or list of Wall) for the wall repulsion.
+        pairs: candidate (i, j) pairs; default simulation.neighbor_search over perception_radius.
+        nav_field, group: navigation field set and per-agent destination group.
+        rng: numpy Generator for the random force.
+        agent_params: {attribute: per-agent array}; gradient_strength and radius are used.
+        out, ws: (n, 2) result array and Workspace for the temporaries.
+        density: (n,) array receiving the local density rho_i.
+        stats: dict receiving candidate_pairs and interacting_pairs.
+    """
+    params = as_params(params)
+    n = len(pos)
+    if out is None:
+        out = np.zeros((n, 2), dtype=pos.dtype)
+    if n == 0:
+        return out
+    ws = ws if ws is not None else Workspace(pos.dtype)
+    agent_params = agent_params or {}
+
+    forces = gradient_directions(pos, target, nav_field, group, out=out, ws=ws)
+    gain = agent_params.get("gradient_strength")
+    forces *= params.gradient_strength if gain is None else gain[:, None]
+
+    perception = params.perception_radius
+    if pairs is None:
+        if params.neighbor_search == "dense":
+            pairs = dense_pairs(pos, perception)
+        else:
+            pairs = cell_list_pairs(pos, perception)
+    i_idx, j_idx = pairs
+    m = len(i_idx)
+    if stats is not None:
+        stats["candidate_pairs"] = m
+        stats["interacting_pairs"] = 0
+
+    if m > 0:
+        r_vec = ws.gather("pair_vec", pos, i_idx)
+        r_vec -= ws.gather("pair_tmp", pos, j_idx)
+        d2 = np.einsum("ij,ij->i", r_vec, r_vec, out=ws.get("pair_d2", m, pos.dtype))
+        close = np.less(d2, perception**2, out=ws.get("pair_close", m, bool))
+        if stats is not None:
+            stats["interacting_pairs"] = int(np.count_nonzero(close))
+        if density is not None:
+            counts = ws.get("pair_count", m, np.float64)
+            np.copyto(counts, close)
+            density.fill(0)
+            scatter_add(density, i_idx, counts)
+            scatter_add(density, j_idx, counts)
+            density *= params.density_scale
+        # Pairs beyond perception_radius get zero weight instead of being filtered out.
+        w = np.multiply(d2, -params.repulsive_decay, out=d2)
+        np.exp(w, out=w)
+        w *= 2.0 * params.repulsive_strength
+        w *= close
+        r_vec *= w[:, None]
+
+        # Repulsion minus the resistance term -f_rep * exp(-gamma).
+        f_rep = ws.zeros("pair_force", (n, 2), pos.dtype)
+        scatter_add(f_rep, i_idx, r_vec)
+        scatter_add(f_rep, j_idx, r_vec, sign=-1)
+        f_rep *= 1.0 - params.resistance_factor
+        forces += f_rep
+    elif density is not None:
+        density.fill(0)
+
+    wall_forces(pos, walls, params, agent_params.get("radius"), out=forces)
+
+    kicks = random_forces(n, params, rng, ws=ws)
+    if kicks is not None:
+        rand_mask, rand_vec = kicks
+        forces[rand_mask] += rand_vec
 
     return forces
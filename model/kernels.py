@@ -0,0 +1,262 @@
+# Compute backends for update_physics. "numpy" is the reference
+# implementation in update.py; "numba" fuses pairwise forces, integration,
+# speed clamp, wall projection and the collision pass into compiled loops
+# over neighbour pairs and agents, in place on the engine buffers. Numba is
+# imported lazily, on first use.
+import warnings
+import numpy as np
+
+# Import compatibility (package vs standalone)
+try:
+    from .forces import gradient_directions, random_forces, wall_forces
+    from .neighbors import cell_list_pairs
+    from .params import as_params
+    from .walls import as_segments
+except ImportError:  # pragma: no cover
+    from forces import gradient_directions, random_forces, wall_forces
+    from neighbors import cell_list_pairs
+    from params import as_params
+    from walls import as_segments
+
+BACKENDS = ("numpy", "numba")
+
+_fused_step = None
+
+
+def numba_available():
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_backend(cfg):
+    """Backend named by simulation.backend, falling back to numpy if numba is missing."""
+    name = cfg["simulation"].get("backend", "numpy")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}, expected one of {BACKENDS}")
+    if name == "numba" and not numba_available():
+        warnings.warn("simulation.backend is 'numba' but numba is not installed; using numpy")
+        return "numpy"
+    return name
+
+
+def _get_fused_step():
+    global _fused_step
+    if _fused_step is None:
+        _fused_step = _compile_fused_step()
+    return _fused_step
+
+
+def _compile_fused_step():
+    import numba
+
+    @numba.njit(cache=True)
+    def project_agent(px, py, vx, vy, radius, seg_a, seg_d, seg_len2, seg_perp,
+                      cell_lo, cell_size, cell_shape, cell_start, cell_seg):
+        # Two passes out of the deepest wall contact (see project_walls),
+        # over the segments binned in the agent's WallSegments cell.
+        for _ in range(2):
+            best = -1
+            best_dist = radius
+            best_nx = 0.0
+            best_ny = 0.0
+            cx = min(max(int(np.floor((px - cell_lo[0]) / cell_size)), 0), cell_shape[0] - 1)
+            cy = min(max(int(np.floor((py - cell_lo[1]) / cell_size)), 0), cell_shape[1] - 1)
+            key = cy * cell_shape[0] + cx
+            for q in range(cell_start[key], cell_start[key + 1]):
+                w = cell_seg[q]
+                t = ((px - seg_a[w, 0]) * seg_d[w, 0] + (py - seg_a[w, 1]) * seg_d[w, 1]) / max(seg_len2[w], 1e-12)
+                t = min(max(t, 0.0), 1.0)
+                rx = px - (seg_a[w, 0] + t * seg_d[w, 0])
+                ry = py - (seg_a[w, 1] + t * seg_d[w, 1])
+                d = np.sqrt(rx * rx + ry * ry)
+                if d < best_dist:
+                    best = w
+                    best_dist = d
+                    if d < 1e-9:
+                        best_nx = seg_perp[w, 0]
+                        best_ny = seg_perp[w, 1]
+                    else:
+                        best_nx = rx / d
+                        best_ny = ry / d
+            if best < 0:
+                break
+            px += (radius - best_dist) * best_nx
+            py += (radius - best_dist) * best_ny
+            vn = vx * best_nx + vy * best_ny
+            vx -= vn * best_nx
+            vy -= vn * best_ny
+        return px, py, vx, vy
+
+    @numba.njit(cache=True)
+    def fused_step(pos, vel, active_idx, base_force, i_idx, j_idx,
+                   p_rep, p_decay, res_scale, perception_sq, dt, max_speed, radius,
+                   seg_a, seg_d, seg_len2, seg_perp, cell_lo, cell_size, cell_shape, cell_start, cell_seg,
+                   max_iter, tol, density, density_scale, speed_A):
+        n = active_idx.shape[0]
+        force = base_force.copy()
+        density[:] = 0.0
+
+        # Pairwise repulsion plus resistance, accumulated on both agents.
+        for k in range(i_idx.shape[0]):
+            a = active_idx[i_idx[k]]
+            b = active_idx[j_idx[k]]
+            rx = np.float64(pos[a, 0]) - pos[b, 0]
+            ry = np.float64(pos[a, 1]) - pos[b, 1]
+            d2 = rx * rx + ry * ry
+            if d2 < perception_sq:
+                c = 2.0 * p_rep * np.exp(-p_decay * d2) * res_scale
+                force[i_idx[k], 0] += c * rx
+                force[i_idx[k], 1] += c * ry
+                force[j_idx[k], 0] -= c * rx
+                force[j_idx[k], 1] -= c * ry
+                density[i_idx[k]] += 1.0
+                density[j_idx[k]] += 1.0
+
+        # Integration, speed clamp and wall projection per agent.
+        for k in range(n):
+            a = active_idx[k]
+            vx = vel[a, 0] + force[k, 0] * dt
+            vy = vel[a, 1] + force[k, 1] * dt
+            density[k] *= density_scale
+            cap = max_speed
+            if speed_A > 0.0:
+                cap = max_speed * np.exp(-speed_A * density[k])
+            speed = np.sqrt(vx * vx + vy * vy)
+            if speed > cap:
+                s = cap / speed
+                vx *= s
+                vy *= s
+            px = pos[a, 0] + vx * dt
+            py = pos[a, 1] + vy * dt
+
+            px, py, vx, vy = project_agent(px, py, vx, vy, radius, seg_a, seg_d, seg_len2, seg_perp,
+                                           cell_lo, cell_size, cell_shape, cell_start, cell_seg)
+
+            pos[a, 0] = px
+            pos[a, 1] = py
+            vel[a, 0] = vx
+            vel[a, 1] = vy
+
+        # Symmetric (Jacobi) overlap-resolution passes, as resolve_collisions.
+        min_dist = 2.0 * radius
+        corr = np.zeros((n, 2))
+        iterations = 0
+        residual = 0.0
+        contacts = 0
+        while True:
+            corr[:] = 0.0
+            residual = 0.0
+            for k in range(i_idx.shape[0]):
+                a = active_idx[i_idx[k]]
+                b = active_idx[j_idx[k]]
+                rx = np.float64(pos[a, 0]) - pos[b, 0]
+                ry = np.float64(pos[a, 1]) - pos[b, 1]
+                d2 = rx * rx + ry * ry
+                if d2 < min_dist * min_dist:
+                    dist = max(np.sqrt(d2), 1e-6)
+                    if iterations == 0:
+                        contacts += 1
+                    residual = max(residual, min_dist - dist)
+                    c = 0.5 * (min_dist - dist) / dist
+                    corr[i_idx[k], 0] += c * rx
+                    corr[i_idx[k], 1] += c * ry
+                    corr[j_idx[k], 0] -= c * rx
+                    corr[j_idx[k], 1] -= c * ry
+            if residual <= tol or iterations == max_iter:
+                break
+            # At most half a radius per pass, then back out of the walls (as
+            # resolve_collisions with walls).
+            max_move = 0.5 * radius
+            for k in range(n):
+                a = active_idx[k]
+                cx = corr[k, 0]
+                cy = corr[k, 1]
+                length = np.sqrt(cx * cx + cy * cy)
+                if length > max_move:
+                    cx *= max_move / length
+                    cy *= max_move / length
+                px, py, vx, vy = project_agent(pos[a, 0] + cx, pos[a, 1] + cy, vel[a, 0], vel[a, 1], radius,
+                                               seg_a, seg_d, seg_len2, seg_perp,
+                                               cell_lo, cell_size, cell_shape, cell_start, cell_seg)
+                pos[a, 0] = px
+                pos[a, 1] = py
+                vel[a, 0] = vx
+                vel[a, 1] = vy
+            iterations += 1
+        return iterations, residual, contacts
+
+    return fused_step
+
+
+def update_physics_fused(pos, vel, target, active_idx, walls, params, dt, pairs=None,
+                         nav_field=None, group=None, rng=None, collision_stats=None, density=None):
+    """numba counterpart of update_physics for the agents in active_idx (scalar parameters only)."""
+    params = as_params(params)
+    n = len(active_idx)
+
+    p = pos[active_idx]
+    if pairs is None:
+        cutoff = max(params.perception_radius, 2 * params.radius + 2 * params.max_speed * dt)
+        pairs = cell_list_pairs(p, cutoff)
+
+    g = group[active_idx] if group is not None else None
+    base = gradient_directions(p, target[active_idx], nav_field, g) * params.gradient_strength
+    base = base.astype(np.float64)
+    wall_forces(p, walls, params, out=base)
+    kicks = random_forces(n, params, rng)
+    if kicks is not None:
+        rand_mask, rand_vec = kicks
+        base[rand_mask] += rand_vec
+
+    segments = as_segments(walls, params.radius)
+    i_idx, j_idx = pairs
+    rho = np.zeros(n)
+    iterations, residual, contacts = _get_fused_step()(
+        pos, vel, active_idx.astype(np.int64), base,
+        np.ascontiguousarray(i_idx, dtype=np.int64), np.ascontiguousarray(j_idx, dtype=np.int64),
+        params.repulsive_strength, params.repulsive_decay,
+        1.0 - params.resistance_factor, params.perception_radius ** 2,
+        float(dt), params.max_speed, params.radius,
+        segments.a, segments.d, segments.len2, segments.perp, *segments.cell_table(params.radius),
+        params.collision_iterations, params.collision_tolerance,
+        rho, params.density_scale, params.speed_A if params.density_speed_cap else 0.0,
+    )
+    if density is not None:
+        density[active_idx] = rho
+    if collision_stats is not None:
+        collision_stats["iterations"] = iterations
+        collision_stats["residual_overlap"] = residual
+        collision_stats["contacts"] = contacts
+
+
+def check_backend_parity(cfg, steps=100, seed=0, backends=BACKENDS):
+    """
+    Run the same seeded scenario on each backend and return the largest
+    position difference from the first one (agents matched by id).
+    """
+    # Local import: engine imports this module.
+    try:
+        from .engine import Engine
+    except ImportError:  # pragma: no cover
+        from engine import Engine
+
+    runs = []
+    for backend in backends:
+        run_cfg = {**cfg, "simulation": {**cfg["simulation"], "backend": backend, "seed": seed}}
+        engine = Engine(run_cfg)
+        for _ in range(steps):
+            engine.step()
+        order = np.argsort(engine.ids[engine.active])
+        runs.append((engine.ids[engine.active][order], engine.pos[engine.active][order]))
+
+    ref_ids, ref_pos = runs[0]
+    worst = 0.0
+    for ids, p in runs[1:]:
+        if not np.array_equal(ids, ref_ids):
+            return np.inf
+        if len(p):
+            worst = max(worst, float(np.abs(p - ref_pos).max()))
+    return worst
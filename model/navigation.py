@@ -1,11 +1,54 @@
-import numpy as np
+import time
 import heapq
+import numpy as np
+
+# Import compatibility (package vs standalone)
+try:
+    from .cache import GeometryCache
+    from .walls import WallSegments
+except ImportError:  # pragma: no cover
+    from cache import GeometryCache
+    from walls import WallSegments
+
+# Bump when the construction algorithm changes so stale cache entries miss.
+NAV_CACHE_VERSION = 1
+WALL_FIELD_CACHE_VERSION = 1
+
+# 8-connected moves as (d_row, d_col, cost in cells).
+_NEIGHBORS = (
+    (-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
+    (-1, -1, 1.414), (-1, 1, 1.414), (1, -1, 1.414), (1, 1, 1.414)
+)
+
 
 class NavigationGrid:
     """
     Grid distance field via Dijkstra with a gradient lookup.
+
+    vectorized=True (default) builds the wall raster, distance map and
+    gradient with array operations and scipy.sparse.csgraph; vectorized=False
+    runs the original per-cell loops, which give the same fields.
+    Construction time per phase is kept in self.timings (seconds).
+    Use NavigationGrid.cached(...) to reuse fields across processes.
     """
-    def __init__(self, domain_cfg, walls, target_pos, dx=0.1):
+    CACHED_ARRAYS = ("dist_map", "grad_x", "grad_y", "wall_map")
+
+    def __init__(self, domain_cfg, walls, target_pos, dx=0.1, vectorized=True):
+        self._init_domain(domain_cfg, target_pos, dx)
+
+        phases = [
+            ("rasterize", self._rasterize_walls_vectorized if vectorized else self._rasterize_walls, walls),
+            ("distance", self._compute_distance_csgraph if vectorized else self._compute_dijkstra, target_pos),
+            ("gradient", self._compute_gradient_vectorized if vectorized else self._compute_gradient_field, None),
+        ]
+        self.timings = {}
+        for name, fn, arg in phases:
+            t0 = time.perf_counter()
+            fn() if arg is None else fn(arg)
+            self.timings[name] = time.perf_counter() - t0
+        self.build_time = sum(self.timings.values())
+
+    def _init_domain(self, domain_cfg, target_pos, dx):
         self.xmin, self.xmax = domain_cfg["xmin"], domain_cfg["xmax"]
         self.ymin, self.ymax = domain_cfg["ymin"], domain_cfg["ymax"]
         self.dx = dx
@@ -14,9 +57,123 @@ class NavigationGrid:
         self.grid_shape = (self.rows, self.cols)
         self.dist_map = np.full(self.grid_shape, np.inf)
         self.wall_map = np.zeros(self.grid_shape, dtype=bool)
-        self._rasterize_walls(walls)
-        self._compute_dijkstra(target_pos)
-        self._compute_gradient_field()
+        self.targets = np.atleast_2d(np.asarray(target_pos, dtype=float))
+        # Set by cached(): where the arrays live, so derived data can be cached too.
+        self.cache = None
+        self.cache_key = None
+
+    @staticmethod
+    def cache_key(domain_cfg, walls, target_pos, dx):
+        domain = {k: float(domain_cfg[k]) for k in ("xmin", "xmax", "ymin", "ymax")}
+        return GeometryCache.key(
+            "nav", version=NAV_CACHE_VERSION, domain=domain, dx=float(dx),
+            walls=[w.describe() for w in walls],
+            targets=np.atleast_2d(np.asarray(target_pos, dtype=float)),
+        )
+
+    @classmethod
+    def cached(cls, domain_cfg, walls, target_pos, dx=0.1, cache=None):
+        """
+        Load the field from the geometry cache, building and storing it on a miss.
+
+        Arrays come back as read-only memory maps. cache defaults to a
+        GeometryCache in default_cache_dir().
+        """
+        cache = cache if cache is not None else GeometryCache()
+        key = cls.cache_key(domain_cfg, walls, target_pos, dx)
+
+        t0 = time.perf_counter()
+        arrays = cache.load(key)
+        if arrays is not None and all(name in arrays for name in cls.CACHED_ARRAYS):
+            grid = cls.__new__(cls)
+            grid._init_domain(domain_cfg, target_pos, dx)
+            for name in cls.CACHED_ARRAYS:
+                setattr(grid, name, arrays[name])
+            grid.timings = {"load": time.perf_counter() - t0}
+            grid.build_time = grid.timings["load"]
+            grid.cache_hit = True
+            grid.cache, grid.cache_key = cache, key
+            return grid
+
+        grid = cls(domain_cfg, walls, target_pos, dx)
+        stored = cache.store(key, {name: getattr(grid, name) for name in cls.CACHED_ARRAYS})
+        for name in cls.CACHED_ARRAYS:
+            setattr(grid, name, stored[name])
+        grid.cache_hit = False
+        grid.cache, grid.cache_key = cache, key
+        return grid
+
+    def _cell_centers(self):
+        xs = self.xmin + (np.arange(self.cols) + 0.5) * self.dx
+        ys = self.ymin + (np.arange(self.rows) + 0.5) * self.dx
+        gx, gy = np.meshgrid(xs, ys)
+        return np.column_stack((gx.ravel(), gy.ravel()))
+
+    def _rasterize_walls_vectorized(self, walls):
+        centers = self._cell_centers()
+        hit = np.zeros(len(centers), dtype=bool)
+        for w in walls:
+            hit |= w.distances(centers) <= self.dx * 0.75
+        self.wall_map = hit.reshape(self.grid_shape)
+
+    def _target_cells(self, target_pos):
+        targets = [target_pos] if np.ndim(target_pos) == 1 else target_pos
+        cells = []
+        for tp in targets:
+            tr, tc = self._to_grid(tp)
+            tr = max(0, min(tr, self.rows - 1))
+            tc = max(0, min(tc, self.cols - 1))
+            if not self.wall_map[tr, tc]:
+                cells.append((tr, tc))
+        return cells
+
+    def _compute_distance_csgraph(self, target_pos):
+        from scipy.sparse import csr_matrix
+        from scipy.sparse.csgraph import dijkstra
+
+        rows, cols = self.grid_shape
+        free = ~self.wall_map
+        index_dtype = np.int32 if rows * cols < 2**31 else np.int64
+        index = np.arange(rows * cols, dtype=index_dtype).reshape(self.grid_shape)
+
+        src, dst, weight = [], [], []
+        for dr, dc, cost in _NEIGHBORS:
+            r0, r1 = max(0, -dr), rows - max(0, dr)
+            c0, c1 = max(0, -dc), cols - max(0, dc)
+            ok = free[r0:r1, c0:c1] & free[r0 + dr:r1 + dr, c0 + dc:c1 + dc]
+            src.append(index[r0:r1, c0:c1][ok])
+            dst.append(index[r0 + dr:r1 + dr, c0 + dc:c1 + dc][ok])
+            weight.append(np.full(int(ok.sum()), cost * self.dx))
+
+        n = rows * cols
+        graph = csr_matrix((np.concatenate(weight), (np.concatenate(src), np.concatenate(dst))), shape=(n, n))
+
+        sources = [r * cols + c for r, c in self._target_cells(target_pos)]
+        if not sources:
+            return
+        dist = dijkstra(graph, directed=True, indices=sources, min_only=True)
+        self.dist_map = dist.reshape(self.grid_shape)
+
+    def _compute_gradient_vectorized(self):
+        """Same one-sided/central differences as _compute_gradient_field."""
+        dist = self.dist_map
+        pad = np.pad(dist, 1, constant_values=np.inf)
+        centre = ~np.isinf(dist)
+        self.grad_y = self._masked_difference(dist, pad[:-2, 1:-1], pad[2:, 1:-1], centre)
+        self.grad_x = self._masked_difference(dist, pad[1:-1, :-2], pad[1:-1, 2:], centre)
+
+    def _masked_difference(self, val_c, val_minus, val_plus, centre):
+        valid_minus = ~np.isinf(val_minus)
+        valid_plus = ~np.isinf(val_plus)
+        with np.errstate(invalid="ignore"):
+            central = (val_minus - val_plus) / (2 * self.dx)
+            forward = (val_c - val_plus) / self.dx
+            backward = (val_minus - val_c) / self.dx
+        grad = np.where(valid_minus & valid_plus, central,
+               np.where(valid_plus, forward,
+               np.where(valid_minus, backward, 0.0)))
+        grad[~centre] = 0.0
+        return grad
 
     def _compute_gradient_field(self):
         """Finite-difference gradient on valid (non-wall) cells."""
@@ -84,26 +241,15 @@ class NavigationGrid:
 
     def _compute_dijkstra(self, target_pos):
         pq = []
-        targets = [target_pos] if np.ndim(target_pos) == 1 else target_pos
-        
-        for tp in targets:
-            tr, tc = self._to_grid(tp)
-            tr = max(0, min(tr, self.rows - 1))
-            tc = max(0, min(tc, self.cols - 1))
-            if not self.wall_map[tr, tc]:
-                self.dist_map[tr, tc] = 0.0
-                heapq.heappush(pq, (0.0, tr, tc))
-        
-        neighbors = [
-            (-1, 0, 1.0), (1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0),
-            (-1, -1, 1.414), (-1, 1, 1.414), (1, -1, 1.414), (1, 1, 1.414)
-        ]
+        for tr, tc in self._target_cells(target_pos):
+            self.dist_map[tr, tc] = 0.0
+            heapq.heappush(pq, (0.0, tr, tc))
         
         while pq:
             d, r, c = heapq.heappop(pq)
             if d > self.dist_map[r, c]: continue
             
-            for dr, dc, cost in neighbors:
+            for dr, dc, cost in _NEIGHBORS:
                 nr, nc = r + dr, c + dc
                 if 0 <= nr < self.rows and 0 <= nc < self.cols:
                     if not self.wall_map[nr, nc]:
@@ -143,3 +289,239 @@ class NavigationGrid:
             inv_norm = 1.0 / np.sqrt(norm_sq)
             return np.array([gx * inv_norm, gy * inv_norm])
         return np.zeros(2)
+
+    def get_gradients(self, pos, out=None):
+        """
+        Batched get_gradient: normalized directions for an (N, 2) position array.
+
+        Cells with a vanishing gradient give [0, 0]. Results are written to out
+        when an (N, 2) buffer is supplied.
+        """
+        pos = np.asarray(pos)
+        if out is None:
+            out = np.empty((len(pos), 2), dtype=np.result_type(pos.dtype, np.float32))
+
+        c_f = np.clip((pos[:, 0] - self.xmin) / self.dx - 0.5, 0, self.cols - 1.001)
+        r_f = np.clip((pos[:, 1] - self.ymin) / self.dx - 0.5, 0, self.rows - 1.001)
+
+        c0 = c_f.astype(np.intp)
+        r0 = r_f.astype(np.intp)
+        wc = c_f - c0
+        wr = r_f - r0
+        omc = 1.0 - wc
+        omr = 1.0 - wr
+
+        w00, w01, w10, w11 = omr * omc, omr * wc, wr * omc, wr * wc
+        gx = (w00 * self.grad_x[r0, c0] + w01 * self.grad_x[r0, c0 + 1]
+              + w10 * self.grad_x[r0 + 1, c0] + w11 * self.grad_x[r0 + 1, c0 + 1])
+        gy = (w00 * self.grad_y[r0, c0] + w01 * self.grad_y[r0, c0 + 1]
+              + w10 * self.grad_y[r0 + 1, c0] + w11 * self.grad_y[r0 + 1, c0 + 1])
+
+        norm = np.sqrt(gx * gx + gy * gy)
+        ok = norm > 1e-6
+        inv = np.zeros_like(norm)
+        inv[ok] = 1.0 / norm[ok]
+        out[:, 0] = gx * inv
+        out[:, 1] = gy * inv
+        return out
+
+
+class NavigationFieldSet:
+    """
+    Gradient fields for several destination groups stacked into one
+    contiguous (layers, rows, cols, 2) array.
+
+    group_layer maps a destination group to its layer; -1 selects the trailing
+    all-zero layer, i.e. no field (agents fall back to the straight-line
+    direction). One gather serves every agent regardless of group.
+    """
+    def __init__(self, grids, group_layer=None):
+        ref = grids[0]
+        for g in grids[1:]:
+            if g.grid_shape != ref.grid_shape or g.dx != ref.dx or (g.xmin, g.ymin) != (ref.xmin, ref.ymin):
+                raise ValueError("All navigation grids must share domain and dx")
+        self.xmin, self.ymin = ref.xmin, ref.ymin
+        self.dx = ref.dx
+        self.rows, self.cols = ref.grid_shape
+        self.grids = list(grids)
+
+        # Grids from NavigationGrid.cached() get their stack cached as well, so
+        # processes sharing the geometry share its (read-only) pages.
+        cache = grids[0].cache
+        if cache is not None and all(g.cache_key is not None for g in grids):
+            key = GeometryCache.key("navset", version=NAV_CACHE_VERSION, grids=[g.cache_key for g in grids])
+            arrays = cache.load(key)
+            if arrays is None or "grad" not in arrays:
+                arrays = cache.store(key, {"grad": self._stack(grids)})
+            self.grad = arrays["grad"]
+        else:
+            self.grad = self._stack(grids)
+
+        if group_layer is None:
+            group_layer = np.arange(len(grids))
+        self.group_layer = np.asarray(group_layer, dtype=np.intp)
+
+    def _stack(self, grids):
+        grad = np.zeros((len(grids) + 1, self.rows, self.cols, 2))
+        for k, g in enumerate(grids):
+            grad[k, :, :, 0] = g.grad_x
+            grad[k, :, :, 1] = g.grad_y
+        return grad
+
+    @classmethod
+    def for_destinations(cls, nav_field, dest_targets):
+        """
+        Wrap a NavigationGrid (shared by every group) or a list of grids
+        (matched to destinations by target) as a field set.
+        """
+        if isinstance(nav_field, NavigationGrid):
+            return cls([nav_field], np.zeros(len(dest_targets), dtype=np.intp))
+
+        grids = list(nav_field)
+        layer = np.full(len(dest_targets), -1, dtype=np.intp)
+        for g, t in enumerate(dest_targets):
+            for k, grid in enumerate(grids):
+                if np.any(np.all(np.isclose(grid.targets, t), axis=1)):
+                    layer[g] = k
+                    break
+        return cls(grids, layer)
+
+    @classmethod
+    def build(cls, domain_cfg, walls, dest_targets, dx=0.1, cache=None):
+        """One (optionally cached) NavigationGrid per destination target."""
+        if cache is None:
+            grids = [NavigationGrid(domain_cfg, walls, t, dx) for t in dest_targets]
+        else:
+            grids = [NavigationGrid.cached(domain_cfg, walls, t, dx, cache=cache) for t in dest_targets]
+        return cls(grids)
+
+    def get_gradients(self, pos, group, out=None):
+        """Normalized directions for (N, 2) positions of agents in the given groups."""
+        pos = np.asarray(pos)
+        if out is None:
+            out = np.empty((len(pos), 2), dtype=np.result_type(pos.dtype, np.float32))
+
+        layer = self.group_layer[group]
+        c_f = np.clip((pos[:, 0] - self.xmin) / self.dx - 0.5, 0, self.cols - 1.001)
+        r_f = np.clip((pos[:, 1] - self.ymin) / self.dx - 0.5, 0, self.rows - 1.001)
+
+        c0 = c_f.astype(np.intp)
+        r0 = r_f.astype(np.intp)
+        wc = (c_f - c0)[:, None]
+        wr = (r_f - r0)[:, None]
+
+        g = ((1.0 - wr) * ((1.0 - wc) * self.grad[layer, r0, c0] + wc * self.grad[layer, r0, c0 + 1])
+             + wr * ((1.0 - wc) * self.grad[layer, r0 + 1, c0] + wc * self.grad[layer, r0 + 1, c0 + 1]))
+
+        norm = np.sqrt(np.einsum("ij,ij->i", g, g))
+        ok = norm > 1e-6
+        inv = np.zeros_like(norm)
+        inv[ok] = 1.0 / norm[ok]
+        np.multiply(g, inv[:, None], out=out)
+        return out
+
+
+class WallDistanceField:
+    """
+    Precomputed distance to the nearest wall on the NavigationGrid cell
+    layout (same domain, dx and cell centres), for O(1) wall lookups.
+
+    Each cell stores the exact distance from its centre to the nearest
+    segment (capped at band), the unit normal pointing away from it and the
+    segment index. A point takes its cell's values plus the first-order
+    correction dist + normal . (p - centre), which is exact along straight
+    walls and goes negative for a point that has crossed the wall seen from
+    its cell, so projection pushes it back. query() mirrors
+    WallSegments.query but returns the nearest wall only, so it can replace
+    the segment set in wall_forces and project_walls.
+    """
+    CACHED_ARRAYS = ("dist", "normal", "segment")
+
+    def __init__(self, domain_cfg, walls, dx=0.05, band=1.0):
+        self._init_domain(domain_cfg, dx, band)
+        t0 = time.perf_counter()
+        segments = WallSegments(walls, band)
+        self.n_segments = len(segments)
+
+        centers = self._cell_centers()
+        point, seg, dist, normal = segments.query(centers, band)
+        order = np.lexsort((dist, point))
+        first = order[np.r_[True, point[order][1:] != point[order][:-1]]] if len(order) else order
+
+        n = len(centers)
+        self.dist = np.full(n, self.band)
+        self.normal = np.zeros((n, 2))
+        self.segment = np.full(n, -1, dtype=np.int32)
+        self.dist[point[first]] = dist[first]
+        self.normal[point[first]] = normal[first]
+        self.segment[point[first]] = seg[first]
+        self.dist = self.dist.reshape(self.grid_shape)
+        self.normal = self.normal.reshape(self.grid_shape + (2,))
+        self.segment = self.segment.reshape(self.grid_shape)
+        self.build_time = time.perf_counter() - t0
+
+    def _init_domain(self, domain_cfg, dx, band):
+        self.xmin, self.xmax = domain_cfg["xmin"], domain_cfg["xmax"]
+        self.ymin, self.ymax = domain_cfg["ymin"], domain_cfg["ymax"]
+        self.dx = dx
+        self.band = float(band)
+        self.cols = int(np.ceil((self.xmax - self.xmin) / dx))
+        self.rows = int(np.ceil((self.ymax - self.ymin) / dx))
+        self.grid_shape = (self.rows, self.cols)
+
+    _cell_centers = NavigationGrid._cell_centers
+
+    @staticmethod
+    def cache_key(domain_cfg, walls, dx, band):
+        domain = {k: float(domain_cfg[k]) for k in ("xmin", "xmax", "ymin", "ymax")}
+        return GeometryCache.key(
+            "wall_field", version=WALL_FIELD_CACHE_VERSION, domain=domain, dx=float(dx),
+            band=float(band), walls=[w.describe() for w in walls],
+        )
+
+    @classmethod
+    def cached(cls, domain_cfg, walls, dx=0.05, band=1.0, cache=None):
+        """Load the field from the geometry cache, building and storing it on a miss."""
+        cache = cache if cache is not None else GeometryCache()
+        key = cls.cache_key(domain_cfg, walls, dx, band)
+
+        t0 = time.perf_counter()
+        arrays = cache.load(key)
+        if arrays is not None and all(name in arrays for name in cls.CACHED_ARRAYS):
+            field = cls.__new__(cls)
+            field._init_domain(domain_cfg, dx, band)
+            for name in cls.CACHED_ARRAYS:
+                setattr(field, name, arrays[name])
+            field.n_segments = int(field.segment.max()) + 1 if field.segment.size else 0
+            field.build_time = time.perf_counter() - t0
+            field.cache_hit = True
+            return field
+
+        field = cls(domain_cfg, walls, dx, band)
+        stored = cache.store(key, {name: getattr(field, name) for name in cls.CACHED_ARRAYS})
+        for name in cls.CACHED_ARRAYS:
+            setattr(field, name, stored[name])
+        field.cache_hit = False
+        return field
+
+    def __len__(self):
+        return self.n_segments
+
+    def lookup(self, points):
+        """(distance, normal, segment) of the nearest wall for (N, 2) points."""
+        p = np.asarray(points, dtype=float)
+        c = np.clip(((p[:, 0] - self.xmin) / self.dx).astype(np.intp), 0, self.cols - 1)
+        r = np.clip(((p[:, 1] - self.ymin) / self.dx).astype(np.intp), 0, self.rows - 1)
+        normal = self.normal[r, c]
+        offset = p - np.column_stack((self.xmin + (c + 0.5) * self.dx, self.ymin + (r + 0.5) * self.dx))
+        dist = self.dist[r, c] + np.einsum("ij,ij->i", normal, offset)
+        return dist, normal, self.segment[r, c]
+
+    def query(self, points, cutoff=None):
+        """(point, segment, distance, normal) for points whose nearest wall is closer than cutoff."""
+        cutoff = self.band if cutoff is None else cutoff
+        if cutoff > self.band:
+            raise ValueError(f"Query cutoff {cutoff} exceeds the wall field band {self.band}")
+        dist, normal, seg = self.lookup(points)
+        near = np.flatnonzero((dist < cutoff) & (seg >= 0))
+        return near, seg[near], dist[near], normal[near]
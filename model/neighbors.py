@@ -0,0 +1,202 @@
+import numpy as np
+
+# Half-shell of cell offsets: each unordered pair of neighbouring cells is
+# visited exactly once, the (0, 0) cell is handled separately.
+_HALF_OFFSETS = ((1, 0), (-1, 1), (0, 1), (1, 1))
+
+
+def _expand_ranges(starts, counts):
+    """Flatten [start, start + count) ranges into (owner, index) arrays."""
+    total = int(counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, starts[owner] + offsets
+
+
+def cell_list_pairs(pos, cutoff, labels=None):
+    """
+    Return (i, j) index arrays (i < j) of all pairs closer than cutoff.
+
+    Agents are binned on a uniform grid with cell size = cutoff, so only
+    pairs in the same or adjacent cells are ever tested. With labels (one
+    non-negative int per agent) only agents sharing a label are paired, which
+    lets independent systems share one search.
+    """
+    n = len(pos)
+    if n < 2 or cutoff <= 0.0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    cells = np.floor((pos - pos.min(axis=0)) / cutoff).astype(np.int64) + 1
+    width = int(cells[:, 0].max()) + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    if labels is not None:
+        height = int(cells[:, 1].max()) + 2
+        keys += np.asarray(labels, dtype=np.int64) * (height * width)
+
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    uniq, starts, counts = np.unique(sorted_keys, return_index=True, return_counts=True)
+
+    # Pairs inside the same cell (upper triangle of each cell block).
+    local = np.arange(len(order))
+    cell_of = np.repeat(np.arange(len(uniq)), counts)
+    starts_per_agent = starts[cell_of]
+    first, second = _expand_ranges(local + 1, starts_per_agent + counts[cell_of] - local - 1)
+    i_parts = [order[first]]
+    j_parts = [order[second]]
+
+    # Pairs across neighbouring cells.
+    for dx, dy in _HALF_OFFSETS:
+        nkeys = sorted_keys + dy * width + dx
+        slot = np.searchsorted(uniq, nkeys)
+        slot[slot >= len(uniq)] = 0
+        hit = uniq[slot] == nkeys
+        if not np.any(hit):
+            continue
+        src = local[hit]
+        first, second = _expand_ranges(starts[slot[hit]], counts[slot[hit]])
+        i_parts.append(order[src[first]])
+        j_parts.append(order[second])
+
+    i_idx = np.concatenate(i_parts)
+    j_idx = np.concatenate(j_parts)
+
+    d = pos[i_idx] - pos[j_idx]
+    close = np.einsum("ij,ij->i", d, d) < cutoff * cutoff
+    i_idx, j_idx = i_idx[close], j_idx[close]
+
+    swap = i_idx > j_idx
+    i_idx[swap], j_idx[swap] = j_idx[swap], i_idx[swap]
+    return i_idx, j_idx
+
+
+def accept_spawns(pos, active, cand, src, min_dist, labels=None):
+    """
+    Mask of spawn candidates (in arrival order) that keep min_dist to every
+    active agent and to the earlier accepted candidates.
+
+    pos/active are the agent buffers; for an ensemble they are (K, capacity)
+    shaped and labels gives each candidate's replica, so only agents of the
+    same replica conflict. src is the source index of each candidate: only
+    agents within min_dist of one source's candidates are searched, which
+    keeps the cost tied to the crowd at the inlets rather than the domain.
+    """
+    accepted = np.ones(len(cand), dtype=bool)
+    if min_dist <= 0.0 or len(cand) == 0:
+        return accepted
+
+    x, y = pos[..., 0], pos[..., 1]
+    near = np.zeros(active.shape, dtype=bool)
+    for s in np.unique(src):
+        c = cand[src == s]
+        (x0, y0), (x1, y1) = c.min(axis=0) - min_dist, c.max(axis=0) + min_dist
+        near |= (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+    near &= active
+    idx = np.nonzero(near)
+    m = len(idx[0])
+
+    pts = np.concatenate((pos[idx], cand))
+    pt_labels = None if labels is None else np.concatenate((idx[0], labels))
+    i_idx, j_idx = cell_list_pairs(pts, min_dist, labels=pt_labels)
+    blocked = (i_idx < m) & (j_idx >= m)
+    accepted[j_idx[blocked] - m] = False
+
+    # Resolve candidate/candidate conflicts in arrival order.
+    among = i_idx >= m
+    if np.any(among):
+        first, second = i_idx[among] - m, j_idx[among] - m
+        order = np.lexsort((second, first))
+        for a, b in zip(first[order], second[order]):
+            if accepted[a]:
+                accepted[b] = False
+    return accepted
+
+
+def dense_pairs(pos, cutoff):
+    """Reference O(N^2) pair search with the same output as cell_list_pairs."""
+    n = len(pos)
+    if n < 2:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    r_vec = pos[:, None, :] - pos[None, :, :]
+    d2 = np.sum(r_vec**2, axis=2)
+    return np.nonzero(np.triu(d2 < cutoff * cutoff, k=1))
+
+
+class VerletList:
+    """
+    Pair list built within cutoff + skin and reused across steps.
+
+    The list is kept in buffer (slot) indices. It is rebuilt when any agent has
+    moved more than skin / 2 since the last build, when agents appear that
+    were not part of the build, or after invalidate() (e.g. a slot was reused).
+    """
+    def __init__(self, cutoff, skin):
+        self.cutoff = cutoff
+        self.skin = skin
+        self.rebuilds = 0
+        self.updates = 0
+        self._ref_pos = None
+        self._built = None
+        self._i = None
+        self._j = None
+        self._stale = True
+        # Reused between rebuilds: slot -> position in active_idx, pair scratch.
+        self._lookup = np.zeros(0, dtype=np.intp)
+        self._range = np.zeros(0, dtype=np.intp)
+        self._scratch = None
+
+    def invalidate(self):
+        self._stale = True
+
+    @property
+    def rebuild_ratio(self):
+        return self.rebuilds / self.updates if self.updates else 0.0
+
+    def _needs_rebuild(self, pos, active_idx):
+        if self._stale or self._ref_pos is None or self._ref_pos.shape != pos.shape:
+            return True
+        if np.any(~self._built[active_idx]):
+            return True
+        disp = pos[active_idx] - self._ref_pos[active_idx]
+        max_d2 = np.max(np.einsum("ij,ij->i", disp, disp)) if len(active_idx) else 0.0
+        return max_d2 > (0.5 * self.skin) ** 2
+
+    def _rebuild(self, pos, active_idx):
+        i_loc, j_loc = cell_list_pairs(pos[active_idx], self.cutoff + self.skin)
+        self._i = active_idx[i_loc]
+        self._j = active_idx[j_loc]
+        self._ref_pos = pos.copy()
+        self._built = np.zeros(len(pos), dtype=bool)
+        self._built[active_idx] = True
+        self._stale = False
+        self.rebuilds += 1
+        m = len(self._i)
+        self._scratch = (np.empty(m, dtype=np.intp), np.empty(m, dtype=np.intp),
+                         np.empty(m, dtype=bool), np.empty(m, dtype=bool))
+
+    def update(self, pos, active_idx):
+        """Return candidate pairs as indices into pos[active_idx]."""
+        self.updates += 1
+        if self._needs_rebuild(pos, active_idx):
+            self._rebuild(pos, active_idx)
+
+        if len(self._lookup) != len(pos):
+            self._lookup = np.empty(len(pos), dtype=np.intp)
+        lookup = self._lookup
+        lookup.fill(-1)
+        if len(self._range) < len(active_idx):
+            self._range = np.arange(len(pos), dtype=np.intp)
+        lookup[active_idx] = self._range[:len(active_idx)]
+        i_loc, j_loc, alive, tmp = self._scratch
+        np.take(lookup, self._i, out=i_loc, mode="clip")
+        np.take(lookup, self._j, out=j_loc, mode="clip")
+        np.greater_equal(i_loc, 0, out=alive)
+        alive &= np.greater_equal(j_loc, 0, out=tmp)
+        if alive.all():
+            return i_loc, j_loc
+        return i_loc[alive], j_loc[alive]
@@ -0,0 +1,185 @@
+import numpy as np
+
+# Import compatibility (package vs standalone)
+try:
+    from .workspace import PRECISIONS
+except ImportError:  # pragma: no cover
+    from workspace import PRECISIONS
+
+# Attributes that can vary per agent, in sampling order (a "scale"
+# distribution may refer to an attribute earlier in this list).
+AGENT_ATTRIBUTES = ("radius", "desired_speed", "max_speed", "gradient_strength")
+
+DISTRIBUTIONS = ("constant", "uniform", "normal", "choice", "scale")
+
+
+class SimParams:
+    """
+    Scenario parameters compiled once from the YAML config.
+
+    Nested cfg entries become flat, validated, read-only attributes (setting
+    one afterwards raises AttributeError), so the physics reads plain floats
+    instead of dict lookups. agent.distributions may give, per attribute in
+    AGENT_ATTRIBUTES, a distribution sampled for every spawned agent:
+
+        agent:
+          distributions:
+            desired_speed: {type: normal, mean: 1.5, std: 0.3, min: 0.5, max: 3.0}
+            max_speed: {type: scale, of: desired_speed, factor: 1.3}
+            radius: {type: choice, values: [0.35, 0.45], p: [0.7, 0.3]}
+
+    Types: constant (value), uniform (low, high), normal (mean, std, optional
+    min/max clip, default mean +- 4 std and at least 0), choice (values,
+    optional p) and scale (factor times an earlier attribute). per_agent
+    lists the attributes with a distribution; the rest stay scalars.
+    """
+    def __init__(self, cfg):
+        sim = cfg["simulation"]
+        agent = cfg["agent"]
+        forces = cfg["forces"]
+        wall = forces.get("wall", {})
+
+        self.cfg = cfg
+        self.dt = float(sim["dt"])
+        self.seed = sim.get("seed")
+        self.target_tolerance = float(sim.get("target_tolerance", 0.2))
+        self.neighbor_search = sim.get("neighbor_search", "cell")
+        self.verlet_skin = float(sim.get("verlet_skin", 0.3))
+        self.collision_iterations = int(sim.get("collision_iterations", 1))
+        self.collision_tolerance = float(sim.get("collision_tolerance", 0.0))
+        self.precision = sim.get("precision", "float32")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown simulation.precision {self.precision!r}, expected one of {tuple(PRECISIONS)}")
+        self.dtype = np.dtype(PRECISIONS[self.precision])
+
+        self.radius = float(agent["radius"])
+        self.desired_speed = float(agent["desired_speed"])
+        self.max_speed = float(agent["max_speed"])
+        self.perception_radius = float(agent["perception_radius"])
+        # Density speed cap v_max * exp(-speed_A * rho), rho = N / (pi R^2) with R = perception_radius.
+        self.speed_A = float(agent.get("speed_A", 0.0))
+        self.density_speed_cap = bool(sim.get("density_speed_cap", False))
+        self.density_scale = 1.0 / (np.pi * self.perception_radius**2)
+
+        self.gradient_strength = float(forces["gradient"]["strength"])
+        self.repulsive_strength = float(forces["repulsive"]["strength"])
+        self.repulsive_decay = float(forces["repulsive"]["decay"])
+        self.resistance_gamma = float(forces["resistance"]["gamma"])
+        self.resistance_factor = float(np.exp(-self.resistance_gamma))
+        self.random_probability = float(forces["random"]["probability"])
+        self.random_strength = float(forces["random"]["strength"])
+        self.wall_strength = float(wall.get("strength", 0.0))
+        self.wall_decay = float(wall.get("decay", 5.0))
+        self.wall_range = float(wall.get("range", self.perception_radius))
+
+        self.distributions = {}
+        for name, spec in (agent.get("distributions") or {}).items():
+            if name not in AGENT_ATTRIBUTES:
+                raise ValueError(f"agent.distributions.{name}: expected one of {AGENT_ATTRIBUTES}")
+            self.distributions[name] = _compile_distribution(name, spec)
+        self.per_agent = tuple(name for name in AGENT_ATTRIBUTES if name in self.distributions)
+
+        self._validate()
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"SimParams is immutable; cannot set {name!r}")
+        object.__setattr__(self, name, value)
+
+    def _validate(self):
+        positive = ("dt", "radius", "max_speed", "perception_radius", "wall_range")
+        for name in positive:
+            if not getattr(self, name) > 0.0:
+                raise ValueError(f"{name} must be positive, got {getattr(self, name)}")
+        if self.speed_A < 0.0:
+            raise ValueError(f"agent.speed_A must be non-negative, got {self.speed_A}")
+        if not 0.0 <= self.random_probability <= 1.0:
+            raise ValueError(f"forces.random.probability must be in [0, 1], got {self.random_probability}")
+        if self.neighbor_search not in ("cell", "verlet", "dense"):
+            raise ValueError(f"Unknown simulation.neighbor_search {self.neighbor_search!r}")
+        if self.collision_iterations < 0 or self.collision_tolerance < 0.0:
+            raise ValueError("collision_iterations and collision_tolerance must be non-negative")
+        for name in ("radius", "max_speed"):
+            if name in self.distributions and not self.lower(name) > 0.0:
+                raise ValueError(f"agent.distributions.{name} must stay positive")
+
+    def upper(self, name):
+        """Largest value attribute name can take (for neighbour-search cutoffs)."""
+        if name not in self.distributions:
+            return getattr(self, name)
+        kind, args = self.distributions[name]
+        if kind == "scale":
+            return args["factor"] * self.upper(args["of"])
+        return args["max"]
+
+    def lower(self, name):
+        if name not in self.distributions:
+            return getattr(self, name)
+        kind, args = self.distributions[name]
+        if kind == "scale":
+            return args["factor"] * self.lower(args["of"])
+        return args["min"]
+
+    def sample(self, n, rng):
+        """{attribute: (n,) array of params.dtype} for n new agents (per_agent attributes only)."""
+        out = {}
+        for name in self.per_agent:
+            kind, args = self.distributions[name]
+            if kind == "constant":
+                values = np.full(n, args["value"])
+            elif kind == "uniform":
+                values = rng.uniform(args["low"], args["high"], n)
+            elif kind == "normal":
+                values = np.clip(rng.normal(args["mean"], args["std"], n), args["min"], args["max"])
+            elif kind == "choice":
+                values = rng.choice(args["values"], n, p=args["p"])
+            else:
+                of = args["of"]
+                values = args["factor"] * (out[of] if of in out else np.full(n, getattr(self, of)))
+            out[name] = values.astype(self.dtype)
+        return out
+
+
+def _compile_distribution(name, spec):
+    if not isinstance(spec, dict):
+        return "constant", {"value": float(spec), "min": float(spec), "max": float(spec)}
+    kind = spec.get("type", "constant")
+    if kind not in DISTRIBUTIONS:
+        raise ValueError(f"agent.distributions.{name}: unknown type {kind!r}, expected one of {DISTRIBUTIONS}")
+
+    if kind == "constant":
+        value = float(spec["value"])
+        args = {"value": value, "min": value, "max": value}
+    elif kind == "uniform":
+        args = {"low": float(spec["low"]), "high": float(spec["high"])}
+        args["min"], args["max"] = args["low"], args["high"]
+    elif kind == "normal":
+        mean, std = float(spec["mean"]), float(spec["std"])
+        if std < 0.0:
+            raise ValueError(f"agent.distributions.{name}: std must be non-negative")
+        args = {"mean": mean, "std": std,
+                "min": float(spec.get("min", max(0.0, mean - 4 * std))),
+                "max": float(spec.get("max", mean + 4 * std))}
+    elif kind == "choice":
+        values = np.asarray(spec["values"], dtype=float)
+        p = spec.get("p")
+        if p is not None:
+            p = np.asarray(p, dtype=float)
+            if len(p) != len(values) or not np.isclose(p.sum(), 1.0):
+                raise ValueError(f"agent.distributions.{name}: p must match values and sum to 1")
+        args = {"values": values, "p": p, "min": float(values.min()), "max": float(values.max())}
+    else:
+        of = spec["of"]
+        if of not in AGENT_ATTRIBUTES or AGENT_ATTRIBUTES.index(of) >= AGENT_ATTRIBUTES.index(name):
+            raise ValueError(f"agent.distributions.{name}: scale must refer to an earlier attribute")
+        args = {"of": of, "factor": float(spec["factor"])}
+
+    if kind != "scale" and args["min"] > args["max"]:
+        raise ValueError(f"agent.distributions.{name}: min exceeds max")
+    return kind, args
+
+
+def as_params(cfg):
+    """SimParams for cfg, unless cfg already is one."""
+    return cfg if isinstance(cfg, SimParams) else SimParams(cfg)
@@ -0,0 +1,124 @@
+import csv
+import json
+import time
+
+
+class StepProfiler:
+    """
+    Opt-in per-phase timers and counters for Engine.step.
+
+    Attach with engine.attach_profiler(StepProfiler()). Each step then
+    produces one flat record: step, time, total_s, "<phase>_s" for every
+    timed phase (spawn, neighbors, forces, integrate, walls, collisions or
+    fused, exits, recorder) and the counters (active, candidate_pairs,
+    interacting_pairs, collision_pairs, collision_iterations, spawns,
+    exits, ...). Work done between steps, such as building engine.agents
+    views ("agents" phase), is added to the next step's record and total. Records are kept in
+    timeline (keep_timeline=False drops them) and passed to callback(record)
+    if given. With no profiler attached the engine only pays a few
+    `is None` checks per step.
+
+    summary() aggregates over all steps; export(path) writes summary and
+    timeline as .json, or the timeline as .csv.
+    """
+    clock = staticmethod(time.perf_counter)
+
+    def __init__(self, callback=None, keep_timeline=True):
+        self.callback = callback
+        self.keep_timeline = keep_timeline
+        self.timeline = []
+        self.steps = 0
+        self.phase_totals = {}
+        self.phase_max = {}
+        self.counter_totals = {}
+        self.counter_max = {}
+        self.total_time = 0.0
+        self._phases = {}
+        self._counters = {}
+        self._start = None
+        self._time = 0.0
+        self._between = 0.0
+
+    def begin_step(self, engine):
+        self._time = engine.time
+        self._start = self.clock()
+        return self._start
+
+    def lap(self, phase, t0):
+        """Add the time since t0 to phase and return the current clock."""
+        now = self.clock()
+        self._phases[phase] = self._phases.get(phase, 0.0) + (now - t0)
+        if self._start is None:
+            self._between += now - t0
+        return now
+
+    def count(self, name, value):
+        self._counters[name] = self._counters.get(name, 0) + value
+
+    def end_step(self):
+        total = self.clock() - self._start + self._between
+        record = {"step": self.steps, "time": self._time, "total_s": total}
+        for phase, seconds in self._phases.items():
+            record[phase + "_s"] = seconds
+            self.phase_totals[phase] = self.phase_totals.get(phase, 0.0) + seconds
+            self.phase_max[phase] = max(self.phase_max.get(phase, 0.0), seconds)
+        for name, value in self._counters.items():
+            record[name] = value
+            self.counter_totals[name] = self.counter_totals.get(name, 0) + value
+            self.counter_max[name] = max(self.counter_max.get(name, 0), value)
+        self.total_time += total
+        self.steps += 1
+        self._phases = {}
+        self._counters = {}
+        self._start = None
+        self._between = 0.0
+
+        if self.keep_timeline:
+            self.timeline.append(record)
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    def summary(self):
+        """Per phase total/mean/max seconds and share of step time; per counter total/mean/max."""
+        steps = max(self.steps, 1)
+        phases = {
+            phase: {"total_s": total, "mean_s": total / steps, "max_s": self.phase_max[phase],
+                    "share": total / self.total_time if self.total_time else 0.0}
+            for phase, total in sorted(self.phase_totals.items(), key=lambda kv: -kv[1])
+        }
+        other = self.total_time - sum(self.phase_totals.values())
+        phases["other"] = {"total_s": other, "mean_s": other / steps, "max_s": None,
+                           "share": other / self.total_time if self.total_time else 0.0}
+        counters = {
+            name: {"total": total, "mean": total / steps, "max": self.counter_max[name]}
+            for name, total in self.counter_totals.items()
+        }
+        return {"steps": self.steps, "total_s": self.total_time, "phases": phases, "counters": counters}
+
+    def report(self):
+        """Summary as a printable table."""
+        s = self.summary()
+        lines = [f"{s['steps']} steps, {s['total_s']:.3f} s"]
+        for phase, p in s["phases"].items():
+            lines.append(f"  {phase:<12} {p['total_s']:9.3f} s  {p['mean_s'] * 1e3:8.3f} ms/step  {p['share']:6.1%}")
+        for name, c in s["counters"].items():
+            lines.append(f"  {name:<20} mean {c['mean']:12.1f}  max {c['max']}")
+        return "\n".join(lines)
+
+    def export(self, path):
+        """Write summary and timeline to path (.json), or the timeline alone (.csv)."""
+        if path.endswith(".csv"):
+            columns = []
+            for record in self.timeline:
+                for key in record:
+                    if key not in columns:
+                        columns.append(key)
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns, restval="")
+                writer.writeheader()
+                writer.writerows(self.timeline)
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "timeline": self.timeline}, f, indent=1)
+        return path
@@ -0,0 +1,172 @@
+import os
+import json
+import numpy as np
+
+# Recorded per-agent fields: name -> (engine attribute, trailing shape, dtype).
+FIELDS = {
+    "pos": ("pos", (2,), np.float32),
+    "vel": ("vel", (2,), np.float32),
+    "ids": ("ids", (), np.int64),
+    "group": ("group", (), np.int32),
+}
+
+
+class TrajectoryRecorder:
+    """
+    Writes active-agent frames to chunked, memory-mapped .npy files.
+
+    Every `every`-th step the active agents' pos, vel, ids and group are
+    copied straight from the engine buffers into the current chunk (one
+    np.compress per field, no temporaries). A chunk holds chunk_rows agent
+    rows; a frame never spans chunks. The frame index (time, chunk, start,
+    count) lives in memory and is written to index.npz on flush()/close().
+    Attach with engine.attach_recorder(recorder); read back with
+    TrajectoryReader(directory).
+    """
+    def __init__(self, directory, every=1, chunk_rows=1 << 20):
+        self.directory = directory
+        self.every = max(1, int(every))
+        self.chunk_rows = int(chunk_rows)
+        os.makedirs(directory, exist_ok=True)
+
+        self._steps = 0
+        self._chunk = -1
+        self._row = 0
+        self._rows_in_chunk = 0
+        self._arrays = None
+        self._chunk_rows_used = []
+
+        self.n_frames = 0
+        self._index = {
+            "time": np.zeros(1024, dtype=np.float64),
+            "chunk": np.zeros(1024, dtype=np.int32),
+            "start": np.zeros(1024, dtype=np.int64),
+            "count": np.zeros(1024, dtype=np.int64),
+        }
+
+    def _chunk_path(self, chunk, field):
+        return os.path.join(self.directory, f"chunk{chunk:05d}.{field}.npy")
+
+    def _open_chunk(self, min_rows):
+        self._close_chunk()
+        self._chunk += 1
+        self._row = 0
+        self._rows_in_chunk = max(self.chunk_rows, min_rows)
+        self._arrays = {
+            field: np.lib.format.open_memmap(
+                self._chunk_path(self._chunk, field), mode="w+", dtype=dtype,
+                shape=(self._rows_in_chunk,) + shape,
+            )
+            for field, (_, shape, dtype) in FIELDS.items()
+        }
+        self._chunk_rows_used.append(0)
+
+    def _close_chunk(self):
+        if self._arrays is None:
+            return
+        for arr in self._arrays.values():
+            arr.flush()
+        self._arrays = None
+
+    def on_step(self, engine):
+        """Called by Engine.step() after each step; records every `every` steps."""
+        self._steps += 1
+        if self._steps % self.every == 0:
+            self.record(engine)
+
+    def record(self, engine):
+        active = engine.active
+        n = int(np.count_nonzero(active))
+        if self._arrays is None or self._row + n > self._rows_in_chunk:
+            self._open_chunk(n)
+
+        rows = slice(self._row, self._row + n)
+        for field, (attr, _, _) in FIELDS.items():
+            np.compress(active, getattr(engine, attr), axis=0, out=self._arrays[field][rows])
+
+        k = self.n_frames
+        if k == len(self._index["time"]):
+            for name, arr in self._index.items():
+                self._index[name] = np.concatenate((arr, np.zeros_like(arr)))
+        self._index["time"][k] = engine.time
+        self._index["chunk"][k] = self._chunk
+        self._index["start"][k] = self._row
+        self._index["count"][k] = n
+        self.n_frames += 1
+
+        self._row += n
+        self._chunk_rows_used[-1] = self._row
+
+    def flush(self):
+        if self._arrays is not None:
+            for arr in self._arrays.values():
+                arr.flush()
+        k = self.n_frames
+        np.savez(os.path.join(self.directory, "index.npz"),
+                 **{name: arr[:k] for name, arr in self._index.items()})
+        with open(os.path.join(self.directory, "meta.json"), "w") as f:
+            json.dump({"every": self.every, "fields": list(FIELDS),
+                       "chunk_rows_used": self._chunk_rows_used}, f)
+
+    def close(self):
+        self.flush()
+        self._close_chunk()
+
+
+class Frame:
+    __slots__ = ("time", "pos", "vel", "ids", "group")
+
+    def __init__(self, time, pos, vel, ids, group):
+        self.time = time
+        self.pos = pos
+        self.vel = vel
+        self.ids = ids
+        self.group = group
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class TrajectoryReader:
+    """
+    Random access to frames written by TrajectoryRecorder.
+
+    Chunks are opened memory-mapped read-only on first use, and frame arrays
+    are slices of them, so nothing is copied until the caller does.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with np.load(os.path.join(directory, "index.npz")) as data:
+            self.times = data["time"]
+            self._chunk = data["chunk"]
+            self._start = data["start"]
+            self._count = data["count"]
+        self._chunks = {}
+
+    def __len__(self):
+        return len(self.times)
+
+    def _chunk_arrays(self, chunk):
+        arrays = self._chunks.get(chunk)
+        if arrays is None:
+            arrays = {
+                field: np.load(os.path.join(self.directory, f"chunk{chunk:05d}.{field}.npy"), mmap_mode="r")
+                for field in FIELDS
+            }
+            self._chunks[chunk] = arrays
+        return arrays
+
+    def frame(self, i):
+        if i < 0:
+            i += len(self)
+        arrays = self._chunk_arrays(int(self._chunk[i]))
+        rows = slice(int(self._start[i]), int(self._start[i] + self._count[i]))
+        return Frame(float(self.times[i]), arrays["pos"][rows], arrays["vel"][rows],
+                     arrays["ids"][rows], arrays["group"][rows])
+
+    def __getitem__(self, i):
+        return self.frame(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.frame(i)
@@ -0,0 +1,89 @@
+import numpy as np
+
+
+class Routes:
+    """
+    Spawn sources and destination groups of a scenario as flat arrays.
+
+    Destinations come from the optional top-level `destinations` list
+    ({name, target, exit_normal}) and from any source `target` not listed
+    there. Sources come from `spawn.sources` ({x, y_range} or
+    {segment: [[x0, y0], [x1, y1]]}, plus `destination` or `target` and an
+    optional `weight`); without it the legacy `spawn.left`/`spawn.right` pair
+    is used. An agent exits once it crosses the plane through its target with
+    normal exit_normal, within simulation.target_tolerance; destinations
+    without a normal use a radial distance test instead.
+    """
+    def __init__(self, cfg):
+        spawn_cfg = cfg["spawn"]
+        if "sources" in spawn_cfg:
+            sources = list(spawn_cfg["sources"])
+            names = [s.get("name", f"source{i}") for i, s in enumerate(sources)]
+        else:
+            names = ["left", "right"]
+            sources = [spawn_cfg[side] for side in names]
+
+        self.dest_names = []
+        targets = []
+        normals = []
+        for i, d in enumerate(cfg.get("destinations", [])):
+            self.dest_names.append(d.get("name", f"dest{i}"))
+            targets.append(np.asarray(d["target"], dtype=float))
+            normals.append(_unit(d.get("exit_normal", [0.0, 0.0])))
+        explicit = len(targets)
+
+        self.source_names = names
+        p0, p1, groups = [], [], []
+        for s in sources:
+            a, b = _inlet(s)
+            p0.append(a)
+            p1.append(b)
+            if "destination" in s:
+                dest = s["destination"]
+                g = self.dest_names.index(dest) if isinstance(dest, str) else int(dest)
+            else:
+                t = np.asarray(s["target"], dtype=float)
+                g = next((k for k, tk in enumerate(targets) if np.allclose(tk, t)), None)
+                if g is None:
+                    g = len(targets)
+                    self.dest_names.append(f"dest{g}")
+                    targets.append(t)
+                    normals.append(np.zeros(2))
+            groups.append(g)
+
+        self.source_p0 = np.array(p0, dtype=float)
+        self.source_p1 = np.array(p1, dtype=float)
+        self.source_group = np.array(groups, dtype=np.int32)
+        weights = np.array([s.get("weight", 1.0) for s in sources], dtype=float)
+        self.source_weight = weights / weights.sum()
+
+        self.dest_targets = np.array(targets, dtype=float).reshape(-1, 2)
+        self.dest_normals = np.array(normals, dtype=float).reshape(-1, 2)
+
+        # Implicit destinations exit along x, away from the sources feeding
+        # them (the original left/right corridor rule).
+        for g in range(explicit, len(targets)):
+            feeding = self.source_group == g
+            mid_x = 0.5 * (self.source_p0[feeding, 0] + self.source_p1[feeding, 0])
+            signs = np.unique(np.sign(self.dest_targets[g, 0] - mid_x))
+            if len(signs) == 1 and signs[0] != 0:
+                self.dest_normals[g] = [signs[0], 0.0]
+
+    @property
+    def n_groups(self):
+        return len(self.dest_targets)
+
+
+def _inlet(source):
+    if "segment" in source:
+        seg = np.asarray(source["segment"], dtype=float)
+        return seg[0], seg[1]
+    y_range = source["y_range"]
+    return (np.array([source["x"], y_range[0]], dtype=float),
+            np.array([source["x"], y_range[1]], dtype=float))
+
+
+def _unit(v):
+    v = np.asarray(v, dtype=float)
+    norm = np.linalg.norm(v)
+    return v / norm if norm > 0 else np.zeros(2)
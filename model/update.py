@@ -3,105 +3,293 @@ import numpy as np
 # Import compatibility (package vs standalone)
 try:
     from .forces import calculate_forces
+    from .kernels import update_physics_fused
+    from .neighbors import cell_list_pairs
+    from .params import as_params
+    from .walls import as_segments
+    from .workspace import Workspace, scatter_add
 except ImportError:  # pragma: no cover
     from forces import calculate_forces
+    from kernels import update_physics_fused
+    from neighbors import cell_list_pairs
+    from params import as_params
+    from walls import as_segments
+    from workspace import Workspace, scatter_add
 
 
-def update_physics(pos, vel, target, active_mask, walls, cfg, dt):
-    """Advance one time step in-place for active agents."""
-    active_idx = np.where(active_mask)[0]
-    if len(active_idx) == 0:
-        return
-
-    p = pos[active_idx]
-    v = vel[active_idx]
-    t = target[active_idx]
+def update_physics(pos, vel, target, active_mask, walls, params, dt, neighbors=None, nav_field=None,
+                   group=None, backend="numpy", rng=None, collision_stats=None, agent_params=None, ws=None,
+                   density=None, profiler=None):
+    """
+    Advance one time step in-place for active agents.
 
-    forces = calculate_forces(p, v, t, walls, cfg)
+    Args:
+        params: SimParams (a cfg dict is compiled on the fly).
+        walls: WallSegments, WallDistanceField or list of Wall.
+        neighbors: VerletList covering perception_radius and the collision distance.
+        nav_field, group: navigation field set and per-agent destination group.
+        backend: "numpy" (reference) or "numba" (fused kernel, scalar parameters only).
+        rng: numpy Generator for the random force.
+        collision_stats: dict receiving iterations, residual_overlap and contacts.
+        agent_params: {attribute: per-agent buffer} for params.per_agent.
+        ws: Workspace for the step's temporaries (reused across steps).
+        density: per-agent buffer receiving the local density rho_i.
+        profiler: StepProfiler timing the physics phases.
+    """
+    params = as_params(params)
+    prof = profiler
+    ws = ws if ws is not None else Workspace(pos.dtype)
+    n = int(np.count_nonzero(active_mask))
+    if prof is not None:
+        prof.count("active", n)
+        if collision_stats is None:
+            collision_stats = {}
+    if n == 0:
+        return
+    active_idx = np.flatnonzero(active_mask)
 
-    v += forces * dt
+    if prof is not None:
+        t0 = prof.clock()
+    pairs = None
+    if neighbors is not None:
+        pairs = neighbors.update(pos, active_idx)
+        if prof is not None:
+            t0 = prof.lap("neighbors", t0)
 
-    max_speed = cfg["agent"]["max_speed"]
-    speeds = np.linalg.norm(v, axis=1)
-    high_speed = speeds > max_speed
-    if np.any(high_speed):
-        scale = max_speed / speeds[high_speed]
-        v[high_speed] *= scale[:, None]
+    if backend == "numba" and not agent_params:
+        update_physics_fused(pos, vel, target, active_idx, walls, params, dt, pairs=pairs,
+                             nav_field=nav_field, group=group, rng=rng, collision_stats=collision_stats,
+                             density=density)
+        if prof is not None:
+            prof.lap("fused", t0)
+            _count_collisions(prof, collision_stats)
+        return
 
-    p += v * dt
+    p = ws.gather("pos", pos, active_idx)
+    v = ws.gather("vel", vel, active_idx)
+    t = ws.gather("target", target, active_idx)
 
-    radius = cfg["agent"]["radius"]
-    for wall in walls:
-        if wall.type == "horizontal":
-            dy = p[:, 1] - wall.y
-            mask_hit = np.abs(dy) < radius
+    g = ws.gather("group", group, active_idx) if group is not None else None
+    attrs = {name: ws.gather(name, buf, active_idx) for name, buf in agent_params.items()} if agent_params else {}
+    rho = None
+    if density is not None or params.density_speed_cap:
+        rho = ws.get("density", n, pos.dtype)
+    force_stats = {} if prof is not None else None
+    forces = calculate_forces(p, v, t, walls, params, pairs=pairs, nav_field=nav_field, group=g, rng=rng,
+                              agent_params=attrs, out=ws.get("forces", (n, 2), pos.dtype), ws=ws, density=rho,
+                              stats=force_stats)
+    if prof is not None:
+        t0 = prof.lap("forces", t0)
+        prof.count("candidate_pairs", force_stats["candidate_pairs"])
+        prof.count("interacting_pairs", force_stats["interacting_pairs"])
 
-            if hasattr(wall, "x_range") and wall.x_range is not None:
-                mask_hit &= (p[:, 0] >= wall.x_range[0]) & (p[:, 0] <= wall.x_range[1])
+    forces *= dt
+    v += forces
 
-            if np.any(mask_hit):
-                signs = np.sign(dy[mask_hit])
-                p[mask_hit, 1] = wall.y + signs * radius
-                v[mask_hit, 1] = 0.0
+    max_speed = attrs.get("max_speed", params.max_speed)
+    if params.density_speed_cap:
+        max_speed = density_speed_cap(rho, max_speed, params.speed_A, out=ws.get("speed_cap", n, pos.dtype))
+    clamp_speed(v, max_speed, ws=ws)
 
-        elif wall.type == "vertical":
-            dx = p[:, 0] - wall.x
-            mask_hit = np.abs(dx) < radius
+    step = np.multiply(v, dt, out=forces)
+    p += step
 
-            if hasattr(wall, "y_range") and wall.y_range is not None:
-                mask_hit &= (p[:, 1] >= wall.y_range[0]) & (p[:, 1] <= wall.y_range[1])
+    if prof is not None:
+        t0 = prof.lap("integrate", t0)
 
-            if np.any(mask_hit):
-                signs = np.sign(dx[mask_hit])
-                p[mask_hit, 0] = wall.x + signs * radius
-                v[mask_hit, 0] = 0.0
+    radius = attrs.get("radius", params.radius)
+    project_walls(p, v, walls, radius)
+    if prof is not None:
+        t0 = prof.lap("walls", t0)
 
-    p = resolve_collisions(p, radius)
+    resolve_collisions(p, radius, pairs=pairs, max_iter=params.collision_iterations,
+                       tol=params.collision_tolerance, stats=collision_stats, ws=ws, walls=walls, vel=v)
+    if prof is not None:
+        prof.lap("collisions", t0)
+        _count_collisions(prof, collision_stats)
 
     pos[active_idx] = p
     vel[active_idx] = v
+    if density is not None:
+        density[active_idx] = rho
 
 
-def resolve_collisions(pos, radius):
-    n = len(pos)
-    if n < 2:
-        return pos
+def _count_collisions(prof, stats):
+    prof.count("collision_pairs", stats["contacts"])
+    prof.count("collision_iterations", stats["iterations"])
+
 
-    delta = pos[:, None, :] - pos[None, :, :]
-    d2 = np.sum(delta**2, axis=2)
-    np.fill_diagonal(d2, np.inf)
+def density_speed_cap(density, max_speed, speed_A, out=None):
+    """Per-agent speed limit max_speed * exp(-speed_A * density)."""
+    out = np.multiply(density, -speed_A, out=out)
+    np.exp(out, out=out)
+    out *= max_speed
+    return out
 
-    min_dist = 2 * radius
-    mask = d2 < (min_dist**2)
 
-    i_idx, j_idx = np.where(np.triu(mask))
-    if len(i_idx) == 0:
-        return pos
+def clamp_speed(v, max_speed, ws=None):
+    """Scale velocities above max_speed (scalar or per-agent array) in place."""
+    n = len(v)
+    if ws is None:
+        ws = Workspace(v.dtype)
+    speeds = np.einsum("ij,ij->i", v, v, out=ws.get("speed", n, v.dtype))
+    np.sqrt(speeds, out=speeds)
+    high_speed = np.greater(speeds, max_speed, out=ws.get("speed_high", n, bool))
+    if np.any(high_speed):
+        scale = ws.get("speed_scale", n, v.dtype)
+        scale.fill(1.0)
+        np.divide(max_speed, speeds, out=scale, where=high_speed)
+        v *= scale[:, None]
 
-    p_i = pos[i_idx]
-    p_j = pos[j_idx]
-    vec = p_i - p_j
-    dist = np.linalg.norm(vec, axis=1)
-    dist[dist < 1e-6] = 1e-6
 
-    overlap = min_dist - dist
-    correction = (vec / dist[:, None]) * (0.5 * overlap[:, None])
+def project_walls(p, v, walls, radius, passes=2):
+    """
+    Push agents overlapping a wall back to contact distance, in place, and
+    drop their velocity component along the wall normal (v may be None).
+    radius is a scalar or one value per agent.
+
+    Each pass moves every overlapping agent out of its deepest contact only,
+    so touching collinear segments do not push twice; the second pass
+    handles agents wedged in a corner.
+    """
+    if len(p) == 0:
+        return
+    per_agent = np.ndim(radius) > 0
+    reach = float(np.max(radius))
+    segments = as_segments(walls, reach)
+    idx = np.arange(len(p))
+    for _ in range(passes):
+        agent, _, dist, normal = segments.query(p[idx], reach)
+        contact = radius[idx[agent]] if per_agent else radius
+        depth = contact - dist
+        hit = depth > 0.0
+        agent, depth, normal = agent[hit], depth[hit], normal[hit]
+        if len(agent) == 0:
+            break
+        order = np.lexsort((-depth, agent))
+        first = order[np.r_[True, agent[order][1:] != agent[order][:-1]]]
+        idx = idx[agent[first]]
+        normal = normal[first]
+        p[idx] += depth[first][:, None] * normal
+        if v is not None:
+            v[idx] -= np.einsum("ij,ij->i", v[idx], normal)[:, None] * normal
 
-    np.add.at(pos, i_idx, correction)
-    np.add.at(pos, j_idx, -correction)
+
+def resolve_collisions(pos, radius, pairs=None, max_iter=1, tol=0.0, stats=None, ws=None, walls=None,
+                       vel=None):
+    """
+    Separate overlapping agents in place by symmetric (Jacobi) corrections.
+
+    Each pass moves both agents of every overlapping pair apart by half the
+    overlap; passes repeat until the largest overlap is at most tol or
+    max_iter passes ran.
+
+    Args:
+        radius: scalar or per-agent radii (contact at r_i + r_j).
+        pairs: candidate (i, j) pairs; default a cell-list search over 2 * radius plus margin.
+        stats: dict receiving iterations, residual_overlap and contacts (before the first pass).
+        ws: Workspace for the pair buffers.
+        walls, vel: walls to project onto after every pass (see project_walls), and
+            the velocities whose normal component is dropped there.
+    """
+    n = len(pos)
+    iterations = 0
+    residual = 0.0
+    contacts = 0
+
+    if n >= 2:
+        ws = ws if ws is not None else Workspace(pos.dtype)
+        r_max = float(np.max(radius))
+        if pairs is None:
+            pairs = cell_list_pairs(pos, 2.25 * r_max)
+        i_idx, j_idx = pairs
+        m = len(i_idx)
+        per_agent = np.ndim(radius) > 0
+        if per_agent:
+            min_dist = ws.gather("col_min", radius, i_idx)
+            min_dist += ws.gather("col_tmp_r", radius, j_idx)
+            min_d2 = np.square(min_dist, out=ws.get("col_min2", m, min_dist.dtype))
+        else:
+            min_dist = 2 * radius
+            min_d2 = min_dist**2
+
+        while m:
+            vec = ws.gather("col_vec", pos, i_idx)
+            vec -= ws.gather("col_tmp", pos, j_idx)
+            d2 = np.einsum("ij,ij->i", vec, vec, out=ws.get("col_d2", m, pos.dtype))
+            hit = np.less(d2, min_d2, out=ws.get("col_hit", m, bool))
+            if not hit.any():
+                residual = 0.0
+                break
+            sel = np.flatnonzero(hit)
+            if iterations == 0:
+                contacts = len(sel)
+            dist = ws.gather("col_dist", d2, sel)
+            np.sqrt(dist, out=dist)
+            np.maximum(dist, 1e-6, out=dist)
+            if per_agent:
+                overlap = ws.gather("col_overlap", min_dist, sel)
+                overlap -= dist
+            else:
+                overlap = np.subtract(min_dist, dist, out=ws.get("col_overlap", len(sel), pos.dtype))
+            residual = float(overlap.max())
+            if residual <= tol or iterations == max_iter:
+                break
+
+            overlap *= 0.5
+            overlap /= dist
+            correction = ws.gather("col_corr", vec, sel)
+            correction *= overlap[:, None]
+            if walls is None:
+                scatter_add(pos, ws.gather("col_hi", i_idx, sel), correction)
+                scatter_add(pos, ws.gather("col_hj", j_idx, sel), correction, sign=-1)
+            else:
+                # Moves of at most half a radius per pass keep the centre of an
+                # agent in wall contact on its side; projecting restores contact.
+                shift = ws.zeros("col_shift", (n, 2), pos.dtype)
+                scatter_add(shift, ws.gather("col_hi", i_idx, sel), correction)
+                scatter_add(shift, ws.gather("col_hj", j_idx, sel), correction, sign=-1)
+                length = np.einsum("ij,ij->i", shift, shift, out=ws.get("col_len", n, pos.dtype))
+                np.sqrt(length, out=length)
+                max_move = 0.5 * radius
+                np.maximum(length, max_move, out=length)
+                np.divide(max_move, length, out=length)
+                shift *= length[:, None]
+                pos += shift
+                project_walls(pos, vel, walls, radius)
+            iterations += 1
+
+    if stats is not None:
+        stats["iterations"] = iterations
+        stats["residual_overlap"] = residual
+        stats["contacts"] = contacts
     return pos
 
 
-def check_exits(pos, target, active_mask):
-    idx = np.where(active_mask)[0]
-    if len(idx) == 0:
-        return []
+def check_exits(pos, group, active_mask, dest_targets, dest_normals, tolerance, ws=None):
+    """
+    Indices of active agents that reached their destination group.
+
+    With a non-zero exit normal an agent is done once it is within tolerance
+    of the plane through the target; otherwise within tolerance of the target.
+    ws: optional Workspace for the per-agent temporaries.
+    """
+    n = int(np.count_nonzero(active_mask))
+    if n == 0:
+        return np.zeros(0, dtype=np.intp)
+    ws = ws if ws is not None else Workspace(pos.dtype)
+    idx = np.flatnonzero(active_mask)
 
-    p = pos[idx]
-    t = target[idx]
+    g = ws.gather("exit_group", group, idx)
+    rel = ws.gather("exit_rel", pos, idx)
+    rel -= ws.gather("exit_target", dest_targets, g)
+    normal = ws.gather("exit_normal", dest_normals.astype(rel.dtype, copy=False), g)
+    planar = ws.gather("exit_planar", np.any(dest_normals != 0.0, axis=1), g)
 
-    is_right = t[:, 0] > 10.0
-    exited_right = is_right & (p[:, 0] > (t[:, 0] - 0.2))
-    exited_left = (~is_right) & (p[:, 0] < (t[:, 0] + 0.2))
+    proj = np.einsum("ij,ij->i", rel, normal, out=ws.get("exit_proj", n, rel.dtype))
+    crossed = np.greater(proj, -tolerance, out=ws.get("exit_crossed", n, bool))
+    d2 = np.einsum("ij,ij->i", rel, rel, out=proj)
+    done = np.less(d2, tolerance**2, out=ws.get("exit_done", n, bool))
+    np.copyto(done, crossed, where=planar)
 
-    return idx[exited_right | exited_left]
+    return idx[done]
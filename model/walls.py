@@ -1,5 +1,9 @@
 import numpy as np
 
+# Finite stand-in for the open ends of walls without x_range / y_range.
+WALL_EXTENT = 1e6
+
+
 class Wall:
     def __init__(self, cfg):
         self.type = cfg["type"]
@@ -14,10 +18,44 @@ class Wall:
             self.normal = np.array(cfg["normal"], dtype=float)
             self.y_range = cfg.get("y_range", [-float('inf'), float('inf')])
 
+        elif self.type == "segment":
+            self.points = np.array(cfg["points"], dtype=float).reshape(2, 2)
+            d = self.points[1] - self.points[0]
+            default_normal = np.array([-d[1], d[0]]) / max(np.hypot(*d), 1e-12)
+            self.normal = np.array(cfg.get("normal", default_normal), dtype=float)
+
         else:
             raise ValueError("Unknown wall type")
 
+    def segment(self):
+        """Endpoints as a (2, 2) array; open ends are cut at +-WALL_EXTENT."""
+        if self.type == "horizontal":
+            x0, x1 = np.clip(self.x_range, -WALL_EXTENT, WALL_EXTENT)
+            return np.array([[x0, self.y], [x1, self.y]], dtype=float)
+        if self.type == "vertical":
+            y0, y1 = np.clip(self.y_range, -WALL_EXTENT, WALL_EXTENT)
+            return np.array([[self.x, y0], [self.x, y1]], dtype=float)
+        return self.points.copy()
+
+    def describe(self):
+        """Plain-value description of the wall geometry (used for cache keys)."""
+        if self.type == "segment":
+            return {"type": self.type, "points": self.points.tolist(), "normal": self.normal.tolist()}
+        if self.type == "horizontal":
+            return {"type": self.type, "y": float(self.y), "normal": self.normal.tolist(),
+                    "x_range": [float(v) for v in self.x_range]}
+        return {"type": self.type, "x": float(self.x), "normal": self.normal.tolist(),
+                "y_range": [float(v) for v in self.y_range]}
+
     def distance_and_normal(self, pos):
+        if self.type == "segment":
+            a, b = self.points
+            d = b - a
+            t = np.clip(np.dot(pos - a, d) / max(np.dot(d, d), 1e-12), 0.0, 1.0)
+            n = pos - (a + t * d)
+            dist = np.linalg.norm(n)
+            return dist, n / (dist + 1e-8)
+
         if self.type == "horizontal":
             if self.x_range[0] <= pos[0] <= self.x_range[1]:
                 return abs(pos[1] - self.y), self.normal
@@ -47,3 +85,135 @@ class Wall:
                 n = pos - np.array([self.x, self.y_range[1]])
                 dist = np.linalg.norm(n)
                 return dist, n / (dist + 1e-8)
+
+    def distances(self, points):
+        """Vectorized distance from an (N, 2) array of points to the wall."""
+        points = np.asarray(points, dtype=float)
+        if self.type == "segment":
+            a, b = self.points
+            d = b - a
+            t = np.clip((points - a) @ d / max(np.dot(d, d), 1e-12), 0.0, 1.0)
+            return np.linalg.norm(points - (a + t[:, None] * d), axis=1)
+        if self.type == "horizontal":
+            cx = np.clip(points[:, 0], self.x_range[0], self.x_range[1])
+            return np.hypot(points[:, 0] - cx, points[:, 1] - self.y)
+        cy = np.clip(points[:, 1], self.y_range[0], self.y_range[1])
+        return np.hypot(points[:, 0] - self.x, points[:, 1] - cy)
+
+
+class WallSegments:
+    """
+    All walls as one (W, 2, 2) array of deduplicated segments.
+
+    Segments are binned once into a uniform grid of `cutoff`-sized cells
+    (each segment in every cell its bounding box, grown by cutoff, touches),
+    so query() only measures the agent/segment pairs that can be within
+    cutoff of each other: the cost grows with the walls near each agent, not
+    with the total number of walls. Points outside the grid are clamped to
+    its border cells, which keeps open-ended walls exact.
+    """
+    def __init__(self, walls, cutoff):
+        segs = np.array([w.segment() for w in walls], dtype=float).reshape(-1, 2, 2)
+        # Canonical endpoint order so reversed duplicates collapse too.
+        swap = (segs[:, 0, 0] > segs[:, 1, 0]) | ((segs[:, 0, 0] == segs[:, 1, 0]) & (segs[:, 0, 1] > segs[:, 1, 1]))
+        segs[swap] = segs[swap, ::-1]
+        if len(segs):
+            segs = np.unique(segs, axis=0)
+
+        self.segments = segs
+        self.cutoff = float(cutoff)
+        self.a = segs[:, 0]
+        self.d = segs[:, 1] - segs[:, 0]
+        self.len2 = np.einsum("ij,ij->i", self.d, self.d)
+        # Fallback normal for points lying exactly on a segment.
+        length = np.sqrt(self.len2)
+        self.perp = np.column_stack((-self.d[:, 1], self.d[:, 0])) / np.maximum(length, 1e-12)[:, None]
+        self.perp[length == 0] = [0.0, 1.0]
+        self._build_cells()
+
+    def __len__(self):
+        return len(self.segments)
+
+    def _build_cells(self):
+        cell = self.cutoff
+        pts = self.segments.reshape(-1, 2)
+        finite = pts[np.all(np.abs(pts) < WALL_EXTENT, axis=1)]
+        if len(finite):
+            lo, hi = finite.min(axis=0) - cell, finite.max(axis=0) + cell
+        else:
+            lo = hi = np.zeros(2)
+        self._lo = lo
+        self._shape = (np.floor((hi - lo) / cell).astype(np.int64) + 1)
+
+        seg_lo = np.minimum(self.segments[:, 0], self.segments[:, 1]) - cell
+        seg_hi = np.maximum(self.segments[:, 0], self.segments[:, 1]) + cell
+        c0 = self._cells(seg_lo)
+        c1 = self._cells(seg_hi)
+        span = c1 - c0 + 1
+        counts = span[:, 0] * span[:, 1]
+
+        seg = np.repeat(np.arange(len(self.segments)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cx = c0[seg, 0] + local % span[seg, 0]
+        cy = c0[seg, 1] + local // span[seg, 0]
+        keys = cy * self._shape[0] + cx
+
+        order = np.argsort(keys, kind="stable")
+        self._cell_seg = seg[order]
+        self._cell_start = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=int(np.prod(self._shape))))))
+
+    def _cells(self, points):
+        c = np.floor((points - self._lo) / self.cutoff).astype(np.int64)
+        return np.clip(c, 0, self._shape - 1)
+
+    def cell_table(self, cutoff=None):
+        """
+        (lo, cell size, shape, start, seg) of the segment grid for compiled
+        loops: the segments of cell (cx, cy) are seg[start[k]:start[k + 1]]
+        with k = cy * shape[0] + cx, cell indices clamped to the grid.
+        """
+        if cutoff is not None and cutoff > self.cutoff:
+            raise ValueError(f"Query cutoff {cutoff} exceeds the segment grid cutoff {self.cutoff}")
+        return (self._lo.astype(np.float64), self.cutoff, self._shape.astype(np.int64),
+                self._cell_start.astype(np.int64), self._cell_seg.astype(np.int64))
+
+    def candidates(self, points):
+        """(point, segment) index pairs that may lie within cutoff of each other."""
+        if len(self.segments) == 0 or len(points) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        c = self._cells(points)
+        keys = c[:, 1] * self._shape[0] + c[:, 0]
+        start = self._cell_start[keys]
+        counts = self._cell_start[keys + 1] - start
+        point = np.repeat(np.arange(len(points)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return point, self._cell_seg[np.repeat(start, counts) + offset]
+
+    def closest(self, points, point, seg):
+        """Distance and unit normal (segment towards point) for each pair."""
+        p = np.asarray(points, dtype=float)[point]
+        a, d = self.a[seg], self.d[seg]
+        t = np.einsum("ij,ij->i", p - a, d) / np.maximum(self.len2[seg], 1e-12)
+        r = p - (a + np.clip(t, 0.0, 1.0)[:, None] * d)
+        dist = np.hypot(r[:, 0], r[:, 1])
+        on_wall = dist < 1e-9
+        normal = r / np.where(on_wall, 1.0, dist)[:, None]
+        normal[on_wall] = self.perp[seg[on_wall]]
+        return dist, normal
+
+    def query(self, points, cutoff=None):
+        """(point, segment, distance, normal) for every pair closer than cutoff."""
+        cutoff = self.cutoff if cutoff is None else cutoff
+        if cutoff > self.cutoff:
+            raise ValueError(f"Query cutoff {cutoff} exceeds the segment grid cutoff {self.cutoff}")
+        point, seg = self.candidates(points)
+        dist, normal = self.closest(points, point, seg)
+        near = dist < cutoff
+        return point[near], seg[near], dist[near], normal[near]
+
+
+def as_segments(walls, cutoff):
+    """WallSegments for walls, unless walls already is one (or a WallDistanceField)."""
+    if hasattr(walls, "query"):
+        return walls
+    return WallSegments(walls, cutoff)
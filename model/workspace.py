@@ -0,0 +1,69 @@
+import numpy as np
+
+PRECISIONS = {"float32": np.float32, "float64": np.float64}
+
+
+class Workspace:
+    """
+    Named scratch arrays reused from step to step.
+
+    get(name, shape) returns a view of a per-name buffer that only grows
+    (with 50% headroom), so once the agent and pair counts have settled a
+    step allocates nothing new. Float buffers default to the workspace
+    dtype, which is the engine's precision (simulation.precision).
+    allocations counts buffer (re)allocations, nbytes their total size.
+    Boolean selections still go through np.flatnonzero, which allocates
+    the (small) index array of the selected rows.
+
+    Views are only valid until the next get() of the same name.
+    """
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.allocations = 0
+        self._buffers = {}
+
+    def get(self, name, shape, dtype=None):
+        dtype = self.dtype if dtype is None else np.dtype(dtype)
+        shape = (shape,) if isinstance(shape, (int, np.integer)) else tuple(shape)
+        size = 1
+        for s in shape:
+            size *= int(s)
+        buf = self._buffers.get(name)
+        if buf is None or buf.size < size or buf.dtype != dtype:
+            buf = np.empty(max(size + size // 2, 16), dtype=dtype)
+            self._buffers[name] = buf
+            self.allocations += 1
+        return buf[:size].reshape(shape)
+
+    def zeros(self, name, shape, dtype=None):
+        out = self.get(name, shape, dtype)
+        out.fill(0)
+        return out
+
+    def gather(self, name, src, idx):
+        """src[idx] (along the first axis) into the buffer name; idx must be in range."""
+        out = self.get(name, (len(idx),) + src.shape[1:], src.dtype)
+        # mode="raise" would copy through a temporary buffer.
+        return np.take(src, idx, axis=0, out=out, mode="clip")
+
+    @property
+    def nbytes(self):
+        return sum(buf.nbytes for buf in self._buffers.values())
+
+
+def scatter_add(out, idx, values, sign=1):
+    """
+    out[idx[k]] += sign * values[k] for every k (repeated indices accumulate), in place.
+
+    Sums with np.bincount in float64 and casts into out; ufunc.at would avoid
+    the temporary but is an order of magnitude slower before numpy 1.25.
+    """
+    op = np.add if sign > 0 else np.subtract
+    n = out.shape[0]
+    if out.ndim == 1:
+        op(out, np.bincount(idx, weights=values, minlength=n), out=out, casting="unsafe")
+        return out
+    for k in range(out.shape[1]):
+        col = out[:, k]
+        op(col, np.bincount(idx, weights=values[:, k], minlength=n), out=col, casting="unsafe")
+    return out
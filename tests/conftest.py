@@ -0,0 +1,19 @@
+import os
+import sys
+
+import yaml
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+
+def load_config(name):
+    with open(os.path.join(ROOT, "configs", name + ".yaml"), "r") as f:
+        return yaml.safe_load(f)
+
+
+@pytest.fixture(params=["corridor_empty", "corridor_bottleneck"])
+def cfg(request):
+    """Each shipped corridor config, freshly loaded."""
+    return load_config(request.param)
@@ -0,0 +1,18 @@
+import numpy as np
+import pytest
+
+from model.navigation import NavigationGrid
+from model.walls import Wall
+
+
+@pytest.mark.parametrize("side", ["left", "right"])
+def test_vectorized_build_matches_loops(cfg, side):
+    walls = [Wall(w) for w in cfg.get("walls", [])]
+    target = cfg["spawn"][side]["target"]
+    fast = NavigationGrid(cfg["domain"], walls, target, dx=0.2)
+    slow = NavigationGrid(cfg["domain"], walls, target, dx=0.2, vectorized=False)
+
+    np.testing.assert_array_equal(fast.wall_map, slow.wall_map)
+    np.testing.assert_array_equal(fast.dist_map, slow.dist_map)
+    np.testing.assert_allclose(fast.grad_x, slow.grad_x, atol=1e-12)
+    np.testing.assert_allclose(fast.grad_y, slow.grad_y, atol=1e-12)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from model.neighbors import cell_list_pairs, dense_pairs
+
+
+def as_set(pairs):
+    i, j = pairs
+    return set(zip(np.minimum(i, j).tolist(), np.maximum(i, j).tolist()))
+
+
+@pytest.mark.parametrize("n, cutoff", [(2, 1.0), (50, 0.5), (400, 1.0), (400, 0.3)])
+def test_cell_list_matches_dense(n, cutoff):
+    pos = np.random.default_rng(n).uniform(0.0, 10.0, (n, 2))
+    assert as_set(cell_list_pairs(pos, cutoff)) == as_set(dense_pairs(pos, cutoff))
+
+
+def test_cell_list_labels_only_pair_within_label():
+    rng = np.random.default_rng(7)
+    pos = rng.uniform(0.0, 5.0, (300, 2))
+    labels = rng.integers(0, 3, 300)
+    expected = {(i, j) for i, j in as_set(dense_pairs(pos, 0.8)) if labels[i] == labels[j]}
+    assert as_set(cell_list_pairs(pos, 0.8, labels=labels)) == expected
+
+
+def test_cell_list_pairs_are_ordered_and_unique():
+    pos = np.random.default_rng(3).uniform(0.0, 4.0, (200, 2))
+    i, j = cell_list_pairs(pos, 1.0)
+    assert np.all(i < j)
+    assert len(as_set((i, j))) == len(i)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from model.engine import Engine
+
+K = 150
+
+SETTINGS = {
+    "default": {},
+    "verlet": {"neighbor_search": "verlet"},
+    "shrink": {"shrink_storage": True, "initial_capacity": 8},
+}
+
+
+def make_cfg(cfg, setting):
+    cfg["simulation"].update(SETTINGS[setting], seed=3)
+    return cfg
+
+
+def run(engine, steps):
+    for _ in range(steps):
+        engine.step()
+    return engine
+
+
+def assert_same_state(a, b):
+    np.testing.assert_array_equal(a.active, b.active)
+    np.testing.assert_array_equal(a.pos, b.pos)
+    np.testing.assert_array_equal(a.vel, b.vel)
+    assert a.total_spawned == b.total_spawned and a.total_exits == b.total_exits
+
+
+@pytest.mark.parametrize("setting", sorted(SETTINGS))
+def test_restore_matches_uninterrupted_run(cfg, setting):
+    cfg = make_cfg(cfg, setting)
+    reference = run(Engine(cfg), K)
+    snap = reference.snapshot()
+    run(reference, K)
+
+    resumed = run(Engine.from_snapshot(cfg, snap), K)
+    assert_same_state(reference, resumed)
+
+
+@pytest.mark.parametrize("setting", sorted(SETTINGS))
+def test_saved_snapshot_and_fork_match(cfg, setting, tmp_path):
+    cfg = make_cfg(cfg, setting)
+    engine = run(Engine(cfg), K)
+    path = str(tmp_path / "snap.npz")
+    engine.save_snapshot(path)
+    fork = engine.fork()
+    run(engine, K)
+
+    assert_same_state(engine, run(fork, K))
+    assert_same_state(engine, run(Engine.from_snapshot(cfg, path), K))
+
+
+def test_fork_with_new_rate_spawns_at_that_rate(cfg):
+    cfg["spawn"]["rate"] = 2.0
+    engine = run(Engine(cfg), 1000)
+    for rate in (1.0, 8.0):
+        fork_cfg = {**cfg, "spawn": {**cfg["spawn"], "rate": rate}}
+        fork = engine.fork(cfg=fork_cfg)
+        arrivals = fork.total_arrivals
+        run(fork, 500)
+        # 10 s at the new rate, counted from the fork time.
+        assert abs(fork.total_arrivals - arrivals - 10 * rate) <= 1
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from model.engine import Engine
+from model.kernels import numba_available
+
+BACKENDS = ["numpy", pytest.param("numba", marks=pytest.mark.skipif(not numba_available(), reason="numba"))]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_collisions_keep_agents_inside_walls(cfg, backend):
+    # Heavy inflow packs the corridor, so the collision passes push agents
+    # into the walls and the bottleneck corners.
+    cfg["simulation"].update(collision_iterations=10, backend=backend, seed=113)
+    cfg["spawn"]["rate"] = 10.0
+    engine = Engine(cfg)
+    domain = cfg["domain"]
+    for _ in range(1000):
+        engine.step()
+        idx = np.flatnonzero(engine.active)
+        pos = engine.pos[idx].astype(np.float64)
+        assert np.all((pos[:, 1] >= domain["ymin"]) & (pos[:, 1] <= domain["ymax"]))
+        agent, _, dist, _ = engine.wall_segments.query(pos)
+        assert np.all(dist >= engine.radius[idx][agent] - 1e-4)
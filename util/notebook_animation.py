@@ -1,15 +1,54 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
+from matplotlib.animation import FuncAnimation, FFMpegWriter, PillowWriter
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+
+try:
+    from model.walls import Wall
+except ImportError:  # pragma: no cover
+    from walls import Wall
+
+# Face colour per destination group (group 0 is the legacy left-to-right
+# stream, drawn red; group 1 right-to-left, drawn blue).
+GROUP_COLORS = to_rgba_array(["#d32f2f", "#1976d2", "#388e3c", "#f57c00", "#7b1fa2", "#5d4037"])
 
 
 class NotebookAnimation:
-    def __init__(self, engine):
+    """
+    Live view of a running Engine, or replay of a recorded run.
+
+    NotebookAnimation(engine).run() steps the engine inside the animation
+    callback. NotebookAnimation.from_recording(cfg, reader).replay() draws
+    frames of a TrajectoryReader instead, so the run itself can be simulated
+    headless at full speed; export() renders a recording straight to a video
+    or gif file on an offscreen canvas.
+    """
+    def __init__(self, engine, reader=None, cfg=None, offscreen=False):
         self.engine = engine
-        self.cfg = engine.cfg
+        self.reader = reader
+        if engine is not None:
+            self.cfg = engine.cfg
+            self.walls = engine.walls
+        else:
+            self.cfg = cfg
+            self.walls = [Wall(w) for w in cfg.get("walls", [])]
+
+        if offscreen:
+            # Plain Figure: never attached to pyplot or an interactive backend.
+            self.fig = Figure(figsize=(15, 3))
+            self.ax = self.fig.subplots()
+        else:
+            self.fig, self.ax = plt.subplots(figsize=(15, 3))
+        self._setup_axes()
+
+    @classmethod
+    def from_recording(cls, cfg, reader, offscreen=False):
+        """Animation for a TrajectoryReader, without a live engine."""
+        return cls(None, reader=reader, cfg=cfg, offscreen=offscreen)
 
-        self.fig, self.ax = plt.subplots(figsize=(15, 3))
-        plt.subplots_adjust(left=0.05, right=0.95, top=0.9, bottom=0.1)
+    def _setup_axes(self):
+        self.fig.subplots_adjust(left=0.05, right=0.95, top=0.9, bottom=0.1)
 
         self.ax.set_xlim(self.cfg["domain"]["xmin"], self.cfg["domain"]["xmax"])
         self.ax.set_ylim(self.cfg["domain"]["ymin"], self.cfg["domain"]["ymax"])
@@ -42,7 +81,7 @@ class NotebookAnimation:
         return 0
 
     def _draw_walls(self):
-        for wall in self.engine.walls:
+        for wall in self.walls:
             if wall.type == "horizontal":
                 x0, x1 = wall.x_range
                 self.ax.plot([x0, x1], [wall.y, wall.y], "k-", linewidth=3)
@@ -51,38 +90,72 @@ class NotebookAnimation:
                 y0, y1 = wall.y_range
                 self.ax.plot([wall.x, wall.x], [y0, y1], "k-", linewidth=3)
 
+            else:
+                (x0, y0), (x1, y1) = wall.segment()
+                self.ax.plot([x0, x1], [y0, y1], "k-", linewidth=3)
+
+    def _draw_agents(self, pos, group):
+        self.scat.set_offsets(pos)
+        if len(group):
+            self.scat.set_facecolors(GROUP_COLORS[group % len(GROUP_COLORS)])
+
     def update(self, frame):
         steps_per_frame = 5
         for _ in range(steps_per_frame):
             self.engine.step()
 
-        agents = self.engine.agents
-        if agents:
-            pos = np.array([ag.pos for ag in agents])
-
-            # colour by direction (same heuristic you were using)
-            colors = []
-            for ag in agents:
-                colors.append("#d32f2f" if ag.target_pos[0] > 10 else "#1976d2")
-
-            self.scat.set_offsets(pos)
-            self.scat.set_facecolors(colors)
-        else:
-            self.scat.set_offsets(np.empty((0, 2)))
+        active = self.engine.active
+        self._draw_agents(self.engine.pos[active], self.engine.group[active])
 
         total_spawned = self._total_spawned()
         max_agents = self._max_agents()
         self.time_text.set_text(
-            f"Time: {self.engine.time:.2f} s | Active: {len(self.engine.agents)} | "
+            f"Time: {self.engine.time:.2f} s | Active: {np.count_nonzero(active)} | "
             f"Total: {total_spawned}/{max_agents}"
         )
         return self.scat, self.time_text
 
+    def draw_frame(self, i):
+        """Draw recorded frame i of the reader."""
+        frame = self.reader[i]
+        self._draw_agents(frame.pos, frame.group)
+        self.time_text.set_text(f"Time: {frame.time:.2f} s | Active: {len(frame)}")
+        return self.scat, self.time_text
+
+    def _frame_numbers(self, skip, start, stop):
+        stop = len(self.reader) if stop is None else min(stop, len(self.reader))
+        return range(start, stop, max(1, int(skip)))
+
+    def replay(self, skip=1, interval=30, start=0, stop=None):
+        """Animate recorded frames start, start + skip, ... (blitted, for notebooks)."""
+        frames = self._frame_numbers(skip, start, stop)
+        anim = FuncAnimation(
+            self.fig,
+            self.draw_frame,
+            frames=frames,
+            interval=interval,
+            blit=True,
+        )
+        plt.close(self.fig)
+        return anim
+
+    def export(self, path, skip=1, fps=30, dpi=100, start=0, stop=None):
+        """
+        Render recorded frames to path (.gif via Pillow, anything else via
+        ffmpeg). Each frame is a full redraw of the canvas, without blitting.
+        """
+        writer = PillowWriter(fps=fps) if str(path).endswith(".gif") else FFMpegWriter(fps=fps)
+        with writer.saving(self.fig, path, dpi):
+            for i in self._frame_numbers(skip, start, stop):
+                self.draw_frame(i)
+                writer.grab_frame()
+        return path
+
     def simulation_generator(self, max_frames):
         for i in range(max_frames):
             total_spawned = self._total_spawned()
             max_agents = self._max_agents()
-            if total_spawned >= max_agents and len(self.engine.agents) == 0:
+            if total_spawned >= max_agents and not np.any(self.engine.active):
                 print(f"Simulation Finished at frame {i}")
                 return
             yield i